@@ -0,0 +1,146 @@
+import io
+import json
+import time
+import asyncio
+import itertools
+from collections import Counter
+from typing import Dict, List, Optional
+from aiohttp import web
+
+# === Фейковый Bot API и Google Sheets для нагрузочного теста ===
+# Отвечает так, как отвечал бы Telegram, но ничего никуда не шлёт: запоминает последнее сообщение
+# и выставленный счёт в каждом чате, чтобы сценарий мог нажимать кнопки и оплачивать «настоящие» инвойсы.
+# /img/... изображает CDN с картинками товаров: отдаёт webp с прозрачностью, как tildacdn.
+MESSAGE_METHODS = {"sendMessage", "sendPhoto", "sendInvoice", "editMessageText", "editMessageMedia",
+                   "editMessageCaption", "editMessageReplyMarkup"}
+
+
+def _field(form, name: str):
+    # Сложные поля aiogram шлёт как JSON-строки
+    value = form.get(name)
+    if isinstance(value, str) and value[:1] in "{[":
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+class FakeTelegram:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.last_message: Dict[int, Dict] = {}
+        self.invoices: Dict[int, Dict] = {}
+        self.pre_checkout: Dict[str, bool] = {}
+        self.sheet_rows: List[list] = []
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self.app = web.Application(client_max_size=16 * 1024 * 1024)
+        self.app.router.add_post("/bot{token}/{method}", self.handle_bot)
+        self.app.router.add_post("/v4/spreadsheets/{sheet}/values/{tail}", self.handle_sheets)
+        self.app.router.add_get("/v4/spreadsheets/{sheet}/values/{tail}", self.handle_sheets_get)
+        self.app.router.add_get("/img/{name}", self.handle_image)
+        self._image: Optional[bytes] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.port = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{self.port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def next_message_id(self) -> int:
+        # Входящие сообщения пользователя нумеруются в том же чате, что и ответы бота
+        return next(self._message_ids)
+
+    def _message(self, chat_id: int, message_id: Optional[int] = None, **extra) -> Dict:
+        message = {
+            "message_id": message_id or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "bench_bot"},
+            **extra
+        }
+        self.last_message[chat_id] = message
+        return message
+
+    def _photo(self, form) -> Dict:
+        file_id = f"bench-photo-{next(self._file_ids)}"
+        return {"photo": [{"file_id": file_id, "file_unique_id": file_id, "width": 300, "height": 300}],
+                "caption": form.get("caption", "")}
+
+    def _result(self, method: str, form):
+        chat_id = form.get("chat_id")
+        chat_id = int(chat_id) if chat_id is not None else None
+        message_id = form.get("message_id")
+        message_id = int(message_id) if message_id is not None else None
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "bench_bot", "username": "bench_bot"}
+        if method == "sendMessage":
+            return self._message(chat_id, text=form.get("text", ""))
+        if method == "sendPhoto":
+            return self._message(chat_id, **self._photo(form))
+        if method == "sendInvoice":
+            prices = _field(form, "prices") or []
+            invoice = {"title": form.get("title", ""), "description": form.get("description", ""),
+                       "start_parameter": "", "currency": form.get("currency", "RUB"),
+                       "total_amount": sum(p["amount"] for p in prices)}
+            self.invoices[chat_id] = {**invoice, "payload": form.get("payload", "")}
+            return self._message(chat_id, invoice=invoice)
+        if method == "editMessageText":
+            return self._message(chat_id, message_id, text=form.get("text", ""))
+        if method == "editMessageMedia":
+            media = _field(form, "media") or {}
+            return self._message(chat_id, message_id, **self._photo(media))
+        if method == "answerPreCheckoutQuery":
+            self.pre_checkout[form.get("pre_checkout_query_id")] = form.get("ok") in ("true", "True", True)
+            return True
+        if method in MESSAGE_METHODS:
+            return self._message(chat_id, message_id, text="")
+        # deleteMessage(s), answerCallbackQuery, setWebhook и т.п.
+        return True
+
+    async def handle_bot(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        form = await request.post()
+        if any(isinstance(value, web.FileField) for value in form.values()):
+            self.calls["photo.upload"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": self._result(method, form)})
+
+    async def handle_sheets(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.calls["sheets.append"] += 1
+        self.sheet_rows.extend(body.get("values", []))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"spreadsheetId": request.match_info["sheet"],
+                                  "updates": {"updatedRows": len(body.get("values", []))}})
+
+    async def handle_sheets_get(self, request: web.Request) -> web.Response:
+        # Чтение столбца A: по нему SheetsWriter отсеивает уже записанные заказы
+        self.calls["sheets.get"] += 1
+        return web.json_response({"range": request.match_info["tail"], "majorDimension": "ROWS",
+                                  "values": [row[:1] for row in self.sheet_rows]})
+
+    async def handle_image(self, request: web.Request) -> web.Response:
+        from PIL import Image
+
+        self.calls["image.download"] += 1
+        if self._image is None:
+            out = io.BytesIO()
+            Image.new("RGBA", (1600, 1200), (200, 150, 90, 255)).save(out, "WEBP", quality=80)
+            self._image = out.getvalue()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.Response(body=self._image, content_type="image/webp")
@@ -0,0 +1,128 @@
+import time
+import asyncio
+import fnmatch
+from typing import Dict, List, Optional, Tuple
+
+# === Фейковый Redis для нагрузочного теста ===
+# Минимальный Redis-сервер в памяти: ровно те команды, которые шлют RedisStorage из aiogram и redis-py
+# при подключении (redis-py 5+ сразу просит RESP3 через HELLO), плюс TTL/SCAN для проверки, что у каждой записи FSM стоит срок жизни.
+# Истёкшие ключи удаляются лениво при обращении, как это видит клиент настоящего Redis.
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}  # key -> (value, expires_at)
+        self.commands: Dict[str, int] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.port = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._server = await asyncio.start_server(self._serve, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return f"redis://{host}:{self.port}/0"
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _alive(self, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self.data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry
+
+    def ttl(self, key: bytes) -> int:
+        # Как в Redis: -2 — ключа нет, -1 — ключ без срока жизни
+        entry = self._alive(key)
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return max(0, int(entry[1] - time.time()))
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        resp3 = False  # протокол соединения: от него зависит, как кодируется пустой ответ
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                if command[0].upper() == b"HELLO":
+                    resp3 = len(command) > 1 and command[1] == b"3"
+                writer.write(self._execute(command, resp3))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()  # inline-команда, как из redis-cli
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    def _execute(self, args: List[bytes], resp3: bool) -> bytes:
+        name = args[0].decode().upper()
+        self.commands[name] = self.commands.get(name, 0) + 1
+        if name == "PING":
+            return b"+PONG\r\n"
+        if name == "HELLO":
+            if resp3:
+                return b"%2\r\n+server\r\n+redis\r\n+proto\r\n:3\r\n"
+            return b"*4\r\n+server\r\n+redis\r\n+proto\r\n:2\r\n"
+        if name in ("CLIENT", "SELECT", "QUIT"):
+            return b"+OK\r\n"
+        if name == "GET":
+            entry = self._alive(args[1])
+            if entry is None:
+                return b"_\r\n" if resp3 else b"$-1\r\n"
+            return _bulk(entry[0])
+        if name == "SET":
+            expires_at = None
+            options = [a.decode().upper() for a in args[3:]]
+            for i, option in enumerate(options):
+                if option == "EX":
+                    expires_at = time.time() + int(options[i + 1])
+                elif option == "PX":
+                    expires_at = time.time() + int(options[i + 1]) / 1000
+            self.data[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if name == "DEL":
+            removed = sum(1 for key in args[1:] if self._alive(key) and self.data.pop(key, None))
+            return f":{removed}\r\n".encode()
+        if name == "EXISTS":
+            return f":{sum(1 for key in args[1:] if self._alive(key))}\r\n".encode()
+        if name == "TTL":
+            return f":{self.ttl(args[1])}\r\n".encode()
+        if name in ("KEYS", "SCAN"):
+            # SCAN отдаёт всё за один проход: курсор сразу 0
+            pattern = "*"
+            if name == "KEYS":
+                pattern = args[1].decode()
+            elif b"MATCH" in (a.upper() for a in args):
+                pattern = args[[a.upper() for a in args].index(b"MATCH") + 1].decode()
+            keys = [key for key in list(self.data) if self._alive(key) and fnmatch.fnmatchcase(key.decode(), pattern)]
+            array = _array(keys)
+            return array if name == "KEYS" else b"*2\r\n" + _bulk(b"0") + array
+        if name == "FLUSHDB":
+            self.data.clear()
+            return b"+OK\r\n"
+        return f"-ERR unknown command '{name}'\r\n".encode()
+
+
+def _bulk(value: bytes) -> bytes:
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _array(values: List[bytes]) -> bytes:
+    return b"*%d\r\n" % len(values) + b"".join(_bulk(v) for v in values)
@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import itertools
+from typing import Any, Awaitable, Callable, Dict, List
+
+from fake_api import FakeTelegram
+from fake_redis import FakeRedis
+
+# === Нагрузочный тест бота ===
+# Настоящий dp из bot.py против локального фейкового Bot API и Sheets, полностью офлайн:
+#   python bench/loadtest.py --users 200 --concurrency 50 --latency 0.03
+# Каждый виртуальный покупатель проходит путь /start → категория → товар → количество → корзина →
+# доставка → контакты → оплата → pre_checkout → successful_payment. В конце печатается пропускная способность,
+# p50/p95/p99 по хендлерам и рост памяти процесса.
+# --storage redis гоняет FSM через RedisStorage: на REDIS_URL, если он задан, иначе на локальной заглушке
+# из fake_redis.py; пока идут покупки, ключи FSM периодически проверяются на TTL.
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_TOKEN = "123456:bench-token"
+ADMIN_ID = 1
+FIRST_USER_ID = 10_000
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class Recorder:
+    # Сырые замеры по хендлерам: гистограмм из metrics.py для точных перцентилей не хватает
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]], event, data: Dict[str, Any]):
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - started)
+
+
+class Shopper:
+    _update_ids = itertools.count(1)
+    _query_ids = itertools.count(1)
+
+    def __init__(self, bot_module, fake: FakeTelegram, user_id: int, rnd: random.Random, think: float):
+        self.bot = bot_module
+        self.fake = fake
+        self.user = {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+        self.chat = {"id": user_id, "type": "private"}
+        self.rnd = rnd
+        self.think = think
+
+    async def _feed(self, **payload):
+        from aiogram import types
+
+        update = types.Update.model_validate({"update_id": next(self._update_ids), **payload},
+                                             context={"bot": self.bot.bot})
+        await self.bot.dp.feed_update(self.bot.bot, update)
+        if self.think:
+            await asyncio.sleep(self.rnd.uniform(0, 2 * self.think))
+
+    async def message(self, text: str = None, **extra):
+        message = {"message_id": self.fake.next_message_id(), "date": int(time.time()),
+                   "chat": self.chat, "from": self.user, **extra}
+        if text is not None:
+            message["text"] = text
+        await self._feed(message=message)
+
+    async def press(self, data: str):
+        await self._feed(callback_query={
+            "id": str(next(self._query_ids)), "from": self.user, "chat_instance": str(self.user["id"]),
+            "data": data, "message": self.fake.last_message[self.user["id"]]
+        })
+
+    async def journey(self):
+        catalog = self.bot.CATALOG
+        await self.message("/start")
+        category = self.rnd.choice([cat for cat, items in catalog.categories.items() if items])
+        await self.press(f"cat_{category}")
+        item = self.rnd.choice(catalog.items(category))
+        await self.press(f"item_{item.id}")
+        if len(item.weights) > 1:
+            await self.press(f"add_{item.id}_{self.rnd.choice(item.weights)}")
+        await self.message(str(self.rnd.randint(1, 3)))
+        await self.press("cart_view")
+        await self.press("start_order")
+        await self.press(f"delivery_{self.rnd.choice(list(self.bot.DELIVERY_OPTIONS))}")
+        await self.message("+79991234567")
+        await self.message("bench@example.com")
+        if self.bot.OrderStates.entering_address.state == await self._state():
+            await self.message("Москва, ул. Тестовая, 1")
+        await self.press("confirm_payment")
+
+        invoice = self.fake.invoices.pop(self.user["id"], None)
+        if not invoice:
+            raise RuntimeError("счёт не выставлен")
+        query_id = f"pcq-{next(self._query_ids)}"
+        await self._feed(pre_checkout_query={
+            "id": query_id, "from": self.user, "currency": invoice["currency"],
+            "total_amount": invoice["total_amount"], "invoice_payload": invoice["payload"]
+        })
+        if not self.fake.pre_checkout.get(query_id):
+            raise RuntimeError("pre_checkout отклонён")
+        await self.message(successful_payment={
+            "currency": invoice["currency"], "total_amount": invoice["total_amount"],
+            "invoice_payload": invoice["payload"],
+            "telegram_payment_charge_id": f"tg-{query_id}", "provider_payment_charge_id": f"pr-{query_id}"
+        })
+
+    async def _state(self):
+        from aiogram.fsm.storage.base import StorageKey
+
+        key = StorageKey(bot_id=self.bot.bot.id, chat_id=self.user["id"], user_id=self.user["id"])
+        return await self.bot.storage.get_state(key)
+
+
+async def ttl_probe(storage, interval: float = 0.5):
+    # К концу прогона корзины оплачены и ключи удалены, поэтому TTL смотрим на живых ключах по ходу
+    fsm_keys, without_ttl = set(), set()
+    try:
+        while True:
+            async for key in storage.redis.scan_iter(match="fsm:*"):
+                fsm_keys.add(key)
+                if await storage.redis.ttl(key) == -1:
+                    without_ttl.add(key)
+            await asyncio.sleep(interval)
+    except asyncio.CancelledError:
+        return fsm_keys, without_ttl
+
+
+async def run(args) -> Dict:
+    fake = FakeTelegram(latency=args.latency)
+    base_url = await fake.start()
+    fake_redis = None
+    if args.storage == "redis" and not os.getenv("REDIS_URL"):
+        fake_redis = FakeRedis()
+        os.environ["REDIS_URL"] = await fake_redis.start()
+
+    # bot.py читает настройки при импорте, поэтому окружение готовим до него; файлы бота — во временной папке.
+    # Картинки каталога переадресованы на фейковый CDN, чтобы миниатюры готовились и заливались как в бою.
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    with open(os.path.join(REPO_DIR, "catalog.json"), "r", encoding="utf-8") as f:
+        snapshot = json.load(f)
+    for items in snapshot["catalog"].values():
+        for item in items:
+            item["image_url"] = f"{base_url}/img/{item['id']}.webp"
+    catalog_file = os.path.join(workdir, "catalog.json")
+    with open(catalog_file, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.environ.update({
+        "BOT_TOKEN": BOT_TOKEN,
+        "TELEGRAM_API_URL": base_url,
+        "ADMIN_ID": str(ADMIN_ID),
+        "SHEET_ID": "bench-sheet",
+        "SHEETS_ENDPOINT": base_url + "/",
+        "FSM_STORAGE": args.storage,
+        "CATALOG_FILE": catalog_file,
+        "SNAPSHOT_FORMAT": "json",
+        "PHOTO_WARMUP": "0",
+    })
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    import bot as bot_module
+
+    recorder = Recorder()
+    for observer in (bot_module.dp.message, bot_module.dp.callback_query, bot_module.dp.pre_checkout_query):
+        observer.middleware(recorder)
+    await bot_module.start_parsing()
+    if not bot_module.CATALOG:
+        raise SystemExit("Каталог не загрузился, нагрузочный тест без него бессмысленен")
+    await bot_module.refresh_photos(bot_module.CATALOG)
+
+    rnd = random.Random(args.seed)
+    user_ids = iter(range(FIRST_USER_ID, FIRST_USER_ID + args.warmup + args.users))
+    failures: List[str] = []
+    journey_times: List[float] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def shopper(user_id: int, record: bool):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await Shopper(bot_module, fake, user_id, random.Random(rnd.random()), args.think).journey()
+            except Exception as e:
+                failures.append(f"{user_id}: {type(e).__name__}: {e}")
+                return
+            if record:
+                journey_times.append(time.perf_counter() - started)
+
+    # Прогрев: импорты, кэши разметки, соединения; в замеры не идёт
+    await asyncio.gather(*(shopper(next(user_ids), False) for _ in range(args.warmup)))
+    recorder.samples.clear()
+    rss_before = rss_mb()
+
+    probe = asyncio.create_task(ttl_probe(bot_module.storage)) if args.storage == "redis" else None
+    started = time.perf_counter()
+    await asyncio.gather(*(shopper(next(user_ids), True) for _ in range(args.users)))
+    elapsed = time.perf_counter() - started
+    if probe:
+        probe.cancel()
+        fsm_keys, without_ttl = await probe
+        if not fsm_keys:
+            failures.append("redis: ни одного ключа FSM за прогон")
+        if without_ttl:
+            failures.append(f"redis: {len(without_ttl)} из {len(fsm_keys)} ключей FSM без TTL")
+    rss_after = rss_mb()
+
+    # Дожидаемся, пока журнал заказов доставит всё админу и в таблицу. Админу уведомления идут не быстрее
+    # лимита 1 сообщение/с на чат, поэтому хвост очереди может быть длинным: сдаёмся, только если доставка встала
+    deadline = time.monotonic() + args.drain_timeout
+    left = len(bot_module.OUTBOX.pending())
+    while left and time.monotonic() < deadline:
+        await asyncio.sleep(0.2)
+        pending = len(bot_module.OUTBOX.pending())
+        if pending < left:
+            deadline = time.monotonic() + args.drain_timeout
+        left = pending
+    undelivered = len(bot_module.OUTBOX.pending())
+    await bot_module.OUTBOX.close()
+    if bot_module.SHEETS:
+        await bot_module.SHEETS.close()
+    await bot_module.storage.close()
+    await bot_module.bot.session.close()
+    await fake.stop()
+    if fake_redis:
+        await fake_redis.stop()
+
+    updates = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "latency": args.latency,
+        "storage": args.storage,
+        "elapsed": elapsed,
+        "journeys_per_sec": len(journey_times) / elapsed if elapsed else 0.0,
+        "updates_per_sec": updates / elapsed if elapsed else 0.0,
+        "journey_p50": percentile(journey_times, 50),
+        "journey_p95": percentile(journey_times, 95),
+        "handlers": {
+            name: {"count": len(samples), "p50": percentile(samples, 50),
+                   "p95": percentile(samples, 95), "p99": percentile(samples, 99)}
+            for name, samples in sorted(recorder.samples.items())
+        },
+        "api_calls": dict(fake.calls),
+        "sheet_rows": len(fake.sheet_rows),
+        "undelivered_orders": undelivered,
+        "rss_before_mb": rss_before,
+        "rss_after_mb": rss_after,
+        "failures": failures,
+        "workdir": workdir,
+    }
+
+
+def report(result: Dict) -> str:
+    lines = [
+        f"Покупателей: {result['users']}, одновременно: {result['concurrency']}, "
+        f"задержка API: {result['latency'] * 1000:.0f} мс, FSM: {result['storage']}",
+        f"Время: {result['elapsed']:.1f} с, заказов/с: {result['journeys_per_sec']:.2f}, "
+        f"апдейтов/с: {result['updates_per_sec']:.1f}",
+        f"Путь покупателя: p50 {result['journey_p50']:.2f} с, p95 {result['journey_p95']:.2f} с",
+        "",
+        f"{'хендлер':<28}{'вызовов':>9}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}",
+    ]
+    for name, h in result["handlers"].items():
+        lines.append(f"{name:<28}{h['count']:>9}{h['p50'] * 1000:>10.1f}{h['p95'] * 1000:>10.1f}"
+                     f"{h['p99'] * 1000:>10.1f}")
+    lines += [
+        "",
+        "Вызовы API: " + ", ".join(f"{m}={n}" for m, n in sorted(result["api_calls"].items())),
+        f"Строк в таблице: {result['sheet_rows']}, недоставленных заказов: {result['undelivered_orders']}",
+        f"Память: {result['rss_before_mb']:.1f} → {result['rss_after_mb']:.1f} МБ "
+        f"(+{result['rss_after_mb'] - result['rss_before_mb']:.1f})",
+        f"Ошибок: {len(result['failures'])}",
+        *(f"  {failure}" for failure in result["failures"][:10]),
+    ]
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на фейковом Bot API")
+    parser.add_argument("--users", type=int, default=100, help="сколько покупателей проходит путь до оплаты")
+    parser.add_argument("--concurrency", type=int, default=20, help="сколько из них одновременно")
+    parser.add_argument("--warmup", type=int, default=5, help="покупатели для прогрева, в замеры не входят")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа фейкового API, с")
+    parser.add_argument("--think", type=float, default=1.0,
+                        help="средняя пауза пользователя между шагами, с; при 0 всё упирается в лимит 1 сообщение/с на чат")
+    parser.add_argument("--storage", default="memory", choices=("memory", "sqlite", "redis"),
+                        help="FSM-хранилище; redis — на REDIS_URL или на локальной заглушке")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="сколько ждать доставки заказов без продвижения, с")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="куда дополнительно сохранить результат в JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(run(args))
+    print(report(result))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 1 if result["failures"] or result["undelivered_orders"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
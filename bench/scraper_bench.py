@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# === Бенчмарк и регрессия парсера на офлайн-копии витрины ===
+#   python bench/scraper_bench.py                       — все бэкенды, сверка с эталоном
+#   python bench/scraper_bench.py --backends http       — только HTTP (без браузера, годится для CI)
+#   python bench/scraper_bench.py --update-golden       — перезаписать эталон после осознанного изменения
+#   python bench/scraper_bench.py --baseline base.json  — упасть, если парсинг стал заметно медленнее
+# bench/fixtures/site — страница и ответ getproductslist в формате Tilda: фильтр стоп-слов, «кекс»,
+# товар без вариантов веса (350г по умолчанию), два веса с одной ценой, картинка с «//» и без картинки.
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+SITE_DIR = os.path.join(BENCH_DIR, "fixtures", "site")
+GOLDEN_FILE = os.path.join(BENCH_DIR, "fixtures", "catalog.golden.json")
+BACKENDS = ("http", "sequential", "parallel")
+SAMPLE_INTERVAL = 0.1
+
+
+class _FixtureHandler(SimpleHTTPRequestHandler):
+    # / — страница витрины, /api/getproductslist/ — ответ API магазина; параметры запроса не важны
+    ROUTES = {"/": "index.html", "/api/getproductslist/": "store.json"}
+
+    def do_GET(self):
+        name = self.ROUTES.get(self.path.split("?", 1)[0])
+        if not name:
+            self.send_error(404)
+            return
+        with open(os.path.join(SITE_DIR, name), "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json" if name.endswith(".json") else "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_FixtureHandler, directory=SITE_DIR))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return 0.0
+
+
+def _descendants(root: int) -> List[int]:
+    # Chrome и chromedriver — дочерние процессы; ищем их через /proc, без psutil
+    parents: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    found, frontier = [], [root]
+    while frontier:
+        pid = frontier.pop()
+        children = [child for child, parent in parents.items() if parent == pid]
+        found += children
+        frontier += children
+    return found
+
+
+class MemorySampler(threading.Thread):
+    # Пиковая память процесса бенчмарка и отдельно — браузеров, пока идёт парсинг
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.stop_event = threading.Event()
+        self.peak_self = 0.0
+        self.peak_browser = 0.0
+
+    def run(self):
+        if not os.path.isdir("/proc"):
+            return
+        me = os.getpid()
+        while not self.stop_event.is_set():
+            self.peak_self = max(self.peak_self, _rss_mb(me))
+            self.peak_browser = max(self.peak_browser, sum(_rss_mb(pid) for pid in _descendants(me)))
+            self.stop_event.wait(SAMPLE_INTERVAL)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+
+def browser_available(scraper) -> Optional[str]:
+    try:
+        scraper.make_driver().quit()
+        return None
+    except Exception as e:
+        return f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+
+
+def run_backend(scraper, backend: str) -> Dict:
+    parse = {
+        "http": scraper.parse_catalog_via_http,
+        "sequential": scraper.parse_catalog_sequential,
+        "parallel": scraper.parse_catalog_parallel,
+    }[backend]
+    scraper.SCRAPE_TIMINGS.clear()
+    sampler = MemorySampler()
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        catalog = parse()
+    finally:
+        elapsed = time.perf_counter() - started
+        sampler.stop()
+    return {"catalog": catalog, "seconds": elapsed, "timings": dict(scraper.SCRAPE_TIMINGS),
+            "peak_rss_mb": sampler.peak_self, "browser_rss_mb": sampler.peak_browser}
+
+
+def compare(catalog: Dict, golden: Dict) -> List[str]:
+    # Человекочитаемые расхождения с эталоном: пропавшие и лишние товары, изменившиеся поля
+    problems = []
+    for category in sorted(set(golden) | set(catalog)):
+        expected = {item["name"]: item for item in golden.get(category, [])}
+        actual = {item["name"]: item for item in catalog.get(category, [])}
+        found = [f"{category}: пропал «{name}»" for name in expected if name not in actual]
+        found += [f"{category}: лишний «{name}»" for name in actual if name not in expected]
+        for name in expected.keys() & actual.keys():
+            for field, value in expected[name].items():
+                if actual[name].get(field) != value:
+                    found.append(f"{category} / {name}: {field} {value!r} → {actual[name].get(field)!r}")
+        if not found and list(expected) != list(actual):
+            found.append(f"{category}: изменился порядок товаров")
+        problems += found
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк и регрессия парсера на офлайн-копии витрины")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="через запятую: " + ", ".join(BACKENDS))
+    parser.add_argument("--repeat", type=int, default=1, help="прогонов на бэкенд, в отчёт идёт лучший")
+    parser.add_argument("--golden", default=GOLDEN_FILE)
+    parser.add_argument("--update-golden", action="store_true", help="записать результат первого бэкенда как эталон")
+    parser.add_argument("--baseline", help="JSON с прошлыми временами; сравнить и упасть при замедлении")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="допустимое замедление относительно baseline")
+    parser.add_argument("--save-baseline", help="куда сохранить времена этого прогона")
+    parser.add_argument("--require-browser", action="store_true", help="без Chrome считать Selenium-бэкенды ошибкой")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    server = serve_fixtures()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    # Адреса scraper и store_api читают при импорте
+    os.environ["SITE_URL"] = base_url + "/"
+    os.environ["STORE_API_URL"] = base_url + "/api/getproductslist/"
+    sys.path.insert(0, REPO_DIR)
+    import scraper
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"неизвестные бэкенды: {', '.join(sorted(unknown))}")
+
+    no_browser = None
+    if any(b != "http" for b in backends):
+        no_browser = browser_available(scraper)
+
+    golden = None
+    if os.path.exists(args.golden) and not args.update_golden:
+        with open(args.golden, "r", encoding="utf-8") as f:
+            golden = json.load(f)
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    failed = False
+    timings = {}
+    for backend in backends:
+        if backend != "http" and no_browser:
+            print(f"[{backend}] пропущен: браузер недоступен ({no_browser})")
+            failed |= args.require_browser
+            continue
+        runs = [run_backend(scraper, backend) for _ in range(max(1, args.repeat))]
+        best = min(runs, key=lambda r: r["seconds"])
+        timings[backend] = best["seconds"]
+        products = sum(len(items) for items in best["catalog"].values())
+        print(f"[{backend}] {best['seconds']:.2f} с, товаров: {products}, "
+              f"память процесса: {best['peak_rss_mb']:.0f} МБ, браузеров: {best['browser_rss_mb']:.0f} МБ")
+        for category, seconds in best["timings"].items():
+            print(f"    {category}: {seconds:.2f} с")
+
+        if args.update_golden and golden is None:
+            with open(args.golden, "w", encoding="utf-8") as f:
+                json.dump(best["catalog"], f, ensure_ascii=False, indent=2)
+            golden = best["catalog"]
+            print(f"    эталон записан в {args.golden}")
+        elif golden is not None:
+            problems = compare(best["catalog"], golden)
+            for problem in problems:
+                print(f"    ✗ {problem}")
+            if problems:
+                failed = True
+            else:
+                print("    ✓ совпадает с эталоном")
+        if not products:
+            failed = True
+
+        limit = baseline.get(backend)
+        if limit and best["seconds"] > limit * args.tolerance:
+            print(f"    ✗ медленнее baseline: {best['seconds']:.2f} с против {limit:.2f} с (допуск ×{args.tolerance})")
+            failed = True
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(timings, f, indent=2)
+    server.shutdown()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
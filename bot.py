@@ -1,27 +1,39 @@
+import startup
 import os
 import json
 import time
 import re
 import logging
 import asyncio
+import hashlib
+import secrets
 from contextlib import asynccontextmanager
-from datetime import datetime
+from functools import lru_cache
 from typing import Dict
-from fastapi import FastAPI
+from datetime import datetime
+from fastapi import FastAPI, Request, Response
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command, StateFilter
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.filters import Command, CommandObject, CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, LabeledPrice, PreCheckoutQuery
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from googleapiclient.discovery import build
-from google.oauth2.service_account import Credentials
+from aiogram.types import (FSInputFile, InlineKeyboardButton, InlineKeyboardMarkup, InlineQuery, LabeledPrice,
+                           PreCheckoutQuery)
 from dotenv import load_dotenv
+from catalog import Catalog, CatalogDiff
+from cart import STALE_INVOICE, Cart
+from snapshot import load_catalog, save_catalog, snapshot_mtime
+from render import RenderCache, BACK_TO_MENU
+from search import SearchIndex
+from media import PHOTO_CACHE_FILE, ImageStore, PhotoCache, warm_up
+from storage import create_storage
+from sheets import SheetsWriter
+from outbox import ORDERS_FILE, OrderOutbox
+from workers import UpdateRouter, poll_updates
+import metrics
+from outbound import (GLOBAL_RATE, SENT_IDS_KEY, PaymentPriority, RateLimiter, SentMessageTracker, UpdateUser,
+                      delete_messages, replace_message, replace_with_photo)
 
 # === Настройки и логирование ===
 load_dotenv()
@@ -32,30 +44,183 @@ PROVIDER_TOKEN = "390540012:LIVE:81586"
 CURRENCY = os.getenv("CURRENCY", "RUB")
 ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
 SHEET_ID = os.getenv("SHEET_ID")
+SHEETS_ENDPOINT = os.getenv("SHEETS_ENDPOINT")  # например, адрес фейкового Sheets API
+PHOTO_WARMUP = os.getenv("PHOTO_WARMUP", "0") == "1"  # заливать фото товаров в чат админа после обновления каталога
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")  # свой Bot API сервер или фейковый из bench/
+
+startup.stage("imports")
 
 if not BOT_TOKEN or not PROVIDER_TOKEN:
     raise ValueError("BOT_TOKEN или PROVIDER_TOKEN не найдены в .env!")
 
+# === Режим получения апдейтов ===
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # polling | webhook
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = "/webhook"
+# Секрет можно не задавать явно — тогда он детерминированно выводится из токена и совпадает на всех репликах
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(BOT_TOKEN.encode()).hexdigest()
+if WEBHOOK_URL and not WEBHOOK_URL.startswith("http"):
+    WEBHOOK_URL = "https://" + WEBHOOK_URL
+
+# === Воркеры ===
+# UPDATE_WORKERS=N: этот процесс только принимает апдейты и раскладывает их по N процессам (workers.py).
+# Каталог воркеры берут из общих снимков, FSM — из общего хранилища (SQLite-файл или Redis).
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "0"))
+WORKER_INDEX = int(os.environ["WORKER_INDEX"]) if os.getenv("WORKER_INDEX") else None
+IS_ROUTER = UPDATE_WORKERS > 0 and WORKER_INDEX is None
+BROADCAST_COMMANDS = ("/replay_orders",)  # у каждого воркера свой журнал заказов — команду получают все
+
+
+def is_broadcast(update: Dict) -> bool:
+    message = update.get("message") or {}
+    text = message.get("text") or ""
+    command = text.split(maxsplit=1)[0].split("@", 1)[0] if text.strip() else ""
+    return message.get("from", {}).get("id") == ADMIN_ID and command in BROADCAST_COMMANDS
+
+
+ROUTER = UpdateRouter(UPDATE_WORKERS, broadcast=is_broadcast) if IS_ROUTER else None
+# Хендлеры работают в воркерах, а /metrics отдаёт принимающий процесс: воркеры сбрасывают метрики в общую папку
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+METRICS_INTERVAL = 5
+if UPDATE_WORKERS > 0:
+    metrics.set_process("router" if IS_ROUTER else f"worker-{WORKER_INDEX}")
+
+
+def worker_metrics_path(index: int) -> str:
+    return os.path.join(METRICS_DIR, f"worker-{index}.json")
+
+
+_background = set()
+
+
+def run_in_background(coro):
+    # Ссылка на задачу держится до её завершения, ошибка не теряется, а попадает в лог
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background_done)
+    return task
+
+
+def _background_done(task: asyncio.Task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception():
+        logging.error(f"Фоновая задача {task.get_coro().__name__} упала: {task.exception()!r}")
+
+
+async def start_services():
+    # Всё, что нужно для обработки апдейтов: каталог, журнал заказов, обновление каталога
+    await start_parsing()
+    startup.stage("каталог загружен")
+    await asyncio.to_thread(OUTBOX.load)
+    OUTBOX.replay()
+    # Сайт парсит только один процесс, остальные воркеры подхватывают опубликованные им снимки
+    watch_only = CATALOG_SOURCE == "worker" or (WORKER_INDEX or 0) > 0
+    _background.add(asyncio.create_task(snapshot_watcher() if watch_only else catalog_refresher()))
+    if WORKER_INDEX is not None:
+        _background.add(asyncio.create_task(metrics_exporter()))
+
+
+async def metrics_exporter():
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL)
+        try:
+            await asyncio.to_thread(metrics.write, worker_metrics_path(WORKER_INDEX), metrics.dump())
+        except Exception as e:
+            logging.warning(f"Не удалось сохранить метрики воркера: {e}")
+
+
+async def stop_services():
+    for task in _background:
+        task.cancel()
+    if _update_tasks:
+        await asyncio.wait(_update_tasks, timeout=10)
+    await OUTBOX.close()
+    if SHEETS:
+        await SHEETS.close()
+    await storage.close()
+    await bot.session.close()
+    if WORKER_INDEX is not None:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        metrics.write(worker_metrics_path(WORKER_INDEX), metrics.dump())
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # startup
-    logging.info("Бот стартует через FastAPI + long-polling")
-    await start_parsing()
-    asyncio.create_task(dp.start_polling(bot))
+    logging.info(f"Бот стартует через FastAPI, режим: {BOT_MODE}, воркеров: {UPDATE_WORKERS or 'нет'}")
+    if ROUTER:
+        ROUTER.start()
+    else:
+        await start_services()
+    if BOT_MODE == "webhook":
+        await bot.set_webhook(WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                              allowed_updates=dp.resolve_used_update_types())
+    else:
+        await bot.delete_webhook()
+        if ROUTER:
+            _background.add(asyncio.create_task(poll_updates(bot, dp.resolve_used_update_types(), ROUTER.dispatch)))
+        else:
+            _background.add(asyncio.create_task(dp.start_polling(bot)))
 
     yield
 
     # shutdown
-    await bot.session.close()
+    if ROUTER:
+        for task in _background:
+            task.cancel()
+        await ROUTER.stop()
+        await storage.close()
+        await bot.session.close()
+    else:
+        await stop_services()
     logging.info("Бот остановлен")
 
 # === FastAPI ===
 app = FastAPI(lifespan=lifespan)
 
 # === Бот и Dispatcher ===
-bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
+session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+bot = Bot(token=BOT_TOKEN, session=session)
+storage = metrics.TimedStorage(create_storage())
 dp = Dispatcher(storage=storage)
+bot.session.middleware(SentMessageTracker(storage, skip_chats=[ADMIN_ID]))
+# Лимит Telegram на бота общий, поэтому каждый воркер берёт свою долю
+bot.session.middleware(RateLimiter(global_rate=GLOBAL_RATE / max(1, UPDATE_WORKERS)))
+bot.session.middleware(metrics.ApiTimer())
+bot.session.middleware(startup.FirstRequestTimer())
+dp.update.outer_middleware(UpdateUser())
+dp.update.outer_middleware(PaymentPriority())
+for observer in (dp.message, dp.callback_query, dp.pre_checkout_query, dp.inline_query):
+    observer.middleware(metrics.HandlerTimer())
+
+
+# === Webhook ===
+_update_tasks = set()
+
+
+@app.post(WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+    if not secrets.compare_digest(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), WEBHOOK_SECRET):
+        return Response(status_code=403)
+    data = await request.json()
+    if ROUTER:
+        ROUTER.dispatch(data)
+        return Response(status_code=200)
+    update = types.Update.model_validate(data, context={"bot": bot})
+    # Telegram получает 200 сразу, апдейт обрабатывается в фоне
+    task = asyncio.create_task(dp.feed_update(bot, update))
+    _update_tasks.add(task)
+    task.add_done_callback(_update_tasks.discard)
+    return Response(status_code=200)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    others = []
+    if ROUTER:
+        others = await asyncio.to_thread(metrics.read, [worker_metrics_path(i) for i in range(UPDATE_WORKERS)])
+    return Response(metrics.render(others), media_type="text/plain; version=0.0.4")
 
 
 # === FSM ===
@@ -74,181 +239,157 @@ DELIVERY_OPTIONS = {
     "outside_mkad": {"name": "За МКАД (до 10 км)", "price": 75000},
     "pickup": {"name": "Забрать с производства", "price": 0}
 }
+DELIVERY_PRICES = {key: opt["price"] for key, opt in DELIVERY_OPTIONS.items()}
 
-# === Google Sheets ===
-SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-SERVICE_ACCOUNT_FILE = 'credentials.json'
-
+# === Проверка перед оплатой ===
+# На pre_checkout_query Telegram ждёт ответ не дольше 10 секунд: сверяем подписанный payload счёта
+# с корзиной из FSM и текущими ценами только локально, без сети и пересборки чека
+INVOICE_SECRET = hashlib.sha256(b"invoice:" + BOT_TOKEN.encode()).digest()
+PRE_CHECKOUT_TIMEOUT = 5
 
-def get_sheets_service():
-    try:
-        creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-        return build('sheets', 'v4', credentials=creds)
-    except Exception as e:
-        logging.error(f"Google Sheets ошибка: {e}")
-        return None
-
-
-# === Кэш и парсинг сайта ===
-CACHE_FILE = "catalog.json"
-CACHE_DURATION = 3600
-CATALOG = {}
+# === Google Sheets ===
+SHEETS = SheetsWriter(SHEET_ID, endpoint=SHEETS_ENDPOINT) if SHEET_ID else None
 
+# === Журнал заказов ===
+# У каждого воркера свой журнал: повторную доставку после рестарта делает тот, кто принял заказ
+ORDERS_PATH = os.getenv("ORDERS_FILE", ORDERS_FILE)
+if WORKER_INDEX is not None:
+    ORDERS_PATH = ORDERS_PATH.replace(".jsonl", f"-{WORKER_INDEX}.jsonl")
+OUTBOX = OrderOutbox(ORDERS_PATH, shard=WORKER_INDEX or 0, shards=max(1, UPDATE_WORKERS))
 
-def load_catalog():
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if time.time() - data.get("timestamp", 0) < CACHE_DURATION:
-                return data["catalog"]
-    return None
 
+async def send_order_to_admin(order: Dict):
+    await bot.send_message(ADMIN_ID, order["admin_text"])
 
-def save_catalog(catalog):
-    with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-        json.dump({"catalog": catalog, "timestamp": time.time()}, f, ensure_ascii=False, indent=2)
 
+async def send_order_to_sheet(order: Dict):
+    await SHEETS.append(order["row"])
 
-def parse_catalog() -> Dict:
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--window-size=1920,1080")
 
-    driver = webdriver.Chrome(options=chrome_options)
-    catalog = {'Белый хлеб': [], 'Серый хлеб': [], 'Хлеб с добавками': []}
-    product_id = 0
+if ADMIN_ID:
+    OUTBOX.register("admin", send_order_to_admin)
+if SHEETS:
+    OUTBOX.register("sheet", send_order_to_sheet)
 
-    try:
-        driver.get("https://gorodskoybaton.ru/")
-        WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        time.sleep(3)
-
-        tabs = {
-            'Белый хлеб': 'Белый хлеб',
-            'Серый хлеб': 'Серый хлеб',
-            'Хлеб с добавками': 'Хлеб с добавками'
-        }
-
-        for category, tab_text in tabs.items():
-            try:
-                button = driver.find_element(By.XPATH, f"//button[contains(text(), '{tab_text}')]")
-                driver.execute_script("arguments[0].click();", button)
-                time.sleep(3)
-
-                products = driver.find_elements(By.CSS_SELECTOR, ".js-product")
-                for prod in products:
-                    try:
-                        name = prod.find_element(By.CSS_SELECTOR, ".js-product-name").text.strip()
-                        if not name or any(skip in name.upper() for skip in [
-                            'СТАЖИРОВКА', 'КУРС', 'ТОРТ', 'ПОДАРОК', 'СЕРТИФИКАТ', 'НАБОР'
-                        ]):
-                            continue
-                        if "кекс" in name.lower():
-                            continue
-
-                        description = ""
-                        try:
-                            description = prod.find_element(By.CSS_SELECTOR, ".js-store-prod-descr").text.strip()
-                        except:
-                            pass
-
-                        weights = []
-                        prices = {}
-                        try:
-                            inputs = prod.find_elements(By.CSS_SELECTOR, "input[name='Вес']")
-                            for inp in inputs:
-                                val = inp.get_attribute("value")
-                                if val and val.isdigit():
-                                    weight = f"{val}г"
-                                    weights.append(weight)
-                                    label = inp.find_element(By.XPATH, "./following-sibling::div")
-                                    driver.execute_script("arguments[0].click();", label)
-                                    time.sleep(0.4)
-                                    price_text = prod.find_element(By.CSS_SELECTOR, ".js-product-price").text
-                                    price = int(re.search(r"\d+", price_text.replace(" ", "")).group()) * 100
-                                    prices[weight] = price
-                        except:
-                            pass
-
-                        if not weights:
-                            weights = ["350г"]
-                            price_text = prod.find_element(By.CSS_SELECTOR, ".js-product-price").text
-                            prices["350г"] = int(re.search(r"\d+", price_text.replace(" ", "")).group()) * 100
-
-                        image_url = "https://via.placeholder.com/300x300.png?text=Хлеб"
-                        try:
-                            img = prod.find_element(By.CSS_SELECTOR, "img.js-product-img")
-                            src = img.get_attribute("data-original") or img.get_attribute("src")
-                            if src.startswith("//"):
-                                src = "https:" + src
-                            image_url = src
-                        except:
-                            pass
-
-                        product_id += 1
-                        catalog[category].append({
-                            "id": product_id,
-                            "name": name,
-                            "weights": weights,
-                            "prices": prices,
-                            "composition": description or "Состав не указан",
-                            "image_url": image_url
-                        })
-                    except:
-                        continue
-
-                # Добавляем рождественский кекс
-                product_id += 1
-                catalog[category].append({
-                    "id": product_id,
-                    "name": "Рождественский кекс",
-                    "weights": ["С орехами 🥜", "Без орехов 🚫"],
-                    "prices": {
-                        "С орехами 🥜": 549000,
-                        "Без орехов 🚫": 549000
-                    },
-                    "composition": (
-                        "Традиционный рождественский кекс, пропитанный ромом и коньяком.\nВес ~800–850 г.\nСостав: пшеничная мука, сливочное масло, сахар, яйца, ваниль, изюм, "
-                        "сушёная вишня, финики, инжир, курага, цитрусовые цукаты, специи."
-                    ),
-                    "image_url": "https://optim.tildacdn.com/tild3464-3338-4236-a339-646462623538/-/format/webp/Keks_3D_.jpg.webp"
-                })
-            except Exception as e:
-                logging.warning(f"Ошибка категории {category}: {e}")
-
-        return {k: v for k, v in catalog.items() if v}
 
-    except Exception as e:
-        logging.error(f"Парсинг не удался: {e}")
-        return {}
-    finally:
-        driver.quit()
+# === Кэш и парсинг сайта ===
+CACHE_DURATION = 3600
+REFRESH_AHEAD = 300  # обновляем каталог за 5 минут до истечения кэша
+REFRESH_RETRY = 60  # пауза перед повтором неудачного парсинга
+CATALOG_SOURCE = os.getenv("CATALOG_SOURCE", "inline")  # inline — парсим сами, worker — ждём снимки от scraper.py
+SNAPSHOT_POLL = 5  # как часто проверять, не опубликован ли новый снимок, сек
+CATALOG = Catalog()
+_refresh_lock = asyncio.Lock()
+metrics.Gauge("bot_catalog_age_seconds", "Возраст текущего каталога",
+              lambda: time.time() - CATALOG.timestamp if CATALOG.timestamp else 0.0)
+metrics.Gauge("bot_catalog_products", "Товаров в текущем каталоге", lambda: len(CATALOG.products))
+
+
+def install_catalog(catalog: Catalog) -> CatalogDiff:
+    # Индексы строятся до подмены, хендлеры видят либо старый, либо полностью готовый каталог
+    global CATALOG
+    diff = CatalogDiff(CATALOG, catalog)
+    if not diff:
+        CATALOG.timestamp = catalog.timestamp
+        # Даже без изменений докачиваем картинки, которые в прошлый раз не скачались или не сконвертировались
+        run_in_background(refresh_photos(CATALOG, prune=False))
+        return diff
+    # В кэши уходят только изменения; между apply и подменой нет await, так что они согласованы
+    RENDER.apply(diff, catalog)
+    SEARCH.build(catalog)
+    CATALOG = catalog
+    run_in_background(refresh_photos(catalog, prune=bool(diff.added or diff.changed or diff.removed)))
+    return diff
+
+
+async def refresh_catalog() -> bool:
+    # Парсинг идёт в отдельном потоке, event loop и хендлеры продолжают работать со старым каталогом
+    async with _refresh_lock:
+        logging.info("Парсим сайт...")
+        started = time.time()
+        # Selenium и HTTP-парсер подгружаются только при первом парсинге
+        from scraper import parse_catalog
+        data = await asyncio.to_thread(parse_catalog)
+        metrics.SCRAPE_DURATION.observe(time.time() - started)
+        if not data:
+            logging.warning("Парсинг вернул пустой каталог, оставляем предыдущий")
+            return False
+        catalog = Catalog(data, started)
+        await asyncio.to_thread(save_catalog, catalog)
+        diff = install_catalog(catalog)
+        logging.info(f"Каталог обновлён за {time.time() - started:.1f} с: {diff or 'без изменений'}")
+        return True
+
+
+async def catalog_refresher():
+    while True:
+        delay = CATALOG.timestamp + CACHE_DURATION - REFRESH_AHEAD - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            ok = await refresh_catalog()
+        except Exception as e:
+            logging.error(f"Фоновое обновление каталога не удалось: {e}")
+            ok = False
+        if not ok:
+            metrics.SCRAPE_FAILURES.inc()
+            await asyncio.sleep(REFRESH_RETRY)
+
+
+async def snapshot_watcher():
+    # Режим CATALOG_SOURCE=worker: каталог парсит отдельный процесс (python scraper.py --loop),
+    # бот только следит за опубликованным снимком и подменяет каталог без рестарта
+    last_seen = await asyncio.to_thread(snapshot_mtime)
+    while True:
+        await asyncio.sleep(SNAPSHOT_POLL)
+        try:
+            mtime = await asyncio.to_thread(snapshot_mtime)
+            if mtime == last_seen:
+                continue
+            last_seen = mtime
+            catalog = await asyncio.to_thread(load_catalog)
+            if catalog and catalog.timestamp > CATALOG.timestamp:
+                diff = install_catalog(catalog)
+                logging.info(f"Подхвачен новый снимок каталога: {diff or 'без изменений'}")
+        except Exception as e:
+            logging.error(f"Не удалось подхватить снимок каталога: {e}")
 
 
 async def start_parsing():
-    global CATALOG
-    cached = load_catalog()
+    # Берём даже устаревший кэш: лучше старые цены, чем пустое меню, свежий каталог подтянет catalog_refresher
+    cached = await asyncio.to_thread(load_catalog)
     if cached:
-        CATALOG = cached
+        install_catalog(cached)
         logging.info("Каталог загружен из кэша")
-    else:
-        logging.info("Парсим сайт...")
-        CATALOG = parse_catalog()
-        if CATALOG:
-            save_catalog(CATALOG)
 
 
-def get_product_by_id(product_id: int):
-    for cat in CATALOG.values():
-        for item in cat:
-            if item.get('id') == product_id:
-                return item
-    return None
+async def refresh_photos(catalog: Catalog, prune: bool = True):
+    # Миниатюры готовятся заранее, чтобы карточка товара никогда не ждала CDN; sync качает только недостающие
+    images = {}
+    for pid in catalog.products:
+        image_url = RENDER.item(pid, catalog).image_url
+        if image_url:
+            images[pid] = image_url
+    if prune:
+        await PHOTOS.prune(images)
+    await IMAGES.sync(images.values())
+    if PHOTO_WARMUP and ADMIN_ID:
+        await warm_up(bot, ADMIN_ID, PHOTOS, IMAGES, images.items())
 
 
 # === Клавиатуры ===
+# Статичные клавиатуры собираются один раз, зависящие от каталога — в RENDER при каждой его смене
+RENDER = RenderCache()
+# Кэш file_id у каждого воркера свой: общий файл при записи затирал бы записи соседей
+PHOTOS = PhotoCache(PHOTO_CACHE_FILE.replace(".json", f"-{WORKER_INDEX}.json") if WORKER_INDEX is not None
+                    else PHOTO_CACHE_FILE)
+IMAGES = ImageStore()
+metrics.Gauge("bot_images_cached", "Картинок товаров с готовой локальной миниатюрой", lambda: len(IMAGES.index))
+SEARCH = SearchIndex()
+SEARCH_CACHE_TIME = 300  # сколько Telegram держит ответ на одинаковый запрос у себя, сек
+
+
+@lru_cache(maxsize=None)
 def get_main_menu():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🍞 Белый хлеб", callback_data="cat_Белый хлеб")],
@@ -258,6 +399,7 @@ def get_main_menu():
     ])
 
 
+@lru_cache(maxsize=None)
 def get_delivery_keyboard():
     keyboard = []
     for key, opt in DELIVERY_OPTIONS.items():
@@ -268,6 +410,27 @@ def get_delivery_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+@dp.message(F.chat.type == "private", F.from_user.id == ADMIN_ID, Command("replay_orders"))
+async def cmd_replay_orders(message: types.Message):
+    # Ручной перезапуск доставки заказов, застрявших в журнале
+    pending = OUTBOX.pending()
+    started = OUTBOX.replay()
+    # С воркерами команду получает каждый и отвечает за свой журнал
+    journal = f"Журнал {os.path.basename(ORDERS_PATH)}: " if WORKER_INDEX is not None else ""
+    await message.answer(f"{journal}недоставленных заказов: {len(pending)}, запущено доставок: {started}")
+
+
+@dp.message(F.chat.type == "private", CommandStart(deep_link=True, magic=F.args.regexp(r"^item_\d+$")))
+async def cmd_start_item(message: types.Message, command: CommandObject, state: FSMContext):
+    # Ссылка из inline-поиска: t.me/<бот>?start=item_<id> сразу открывает карточку товара
+    product_id = int(command.args.split("_", 1)[1])
+    if not CATALOG.get(product_id):
+        await handle_start(message)
+        return
+    await state.set_state(None)
+    await send_item_card(message, product_id, state)
+
+
 @dp.message(F.chat.type == "private", StateFilter(None))
 async def handle_start(message: types.Message):
     welcome = (
@@ -290,89 +453,72 @@ async def cmd_start(message: types.Message):
 @dp.callback_query(F.message.chat.type == "private", F.data.startswith("cat_"))
 async def show_category(callback: types.CallbackQuery):
     cat = callback.data.split("_", 1)[1]
-    if cat not in CATALOG or not CATALOG[cat]:
-        await callback.message.delete()
-        await bot.send_message(
-            callback.message.chat.id,
-            "😔 Пока нет товаров в этой категории.",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_menu")]
-            ])
-        )
+    view = RENDER.category(cat, CATALOG)
+    if not view:
+        await replace_message(callback.message, "😔 Пока нет товаров в этой категории.", reply_markup=BACK_TO_MENU)
         return
 
-    keyboard = []
-    for item in CATALOG[cat]:
-        price = item['prices'].get(item['weights'][0], 0) / 100
-        keyboard.append(
-            [InlineKeyboardButton(text=f"{item['name']} — 💰 {price:.0f}₽", callback_data=f"item_{item['id']}")]
-        )
-    keyboard.append([InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_menu")])
-
-    await callback.message.delete()
-    await bot.send_message(callback.message.chat.id, f"📦 *{cat}*",
-                           reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-                           parse_mode="Markdown")
+    text, keyboard = view
+    await replace_message(callback.message, text, reply_markup=keyboard, parse_mode="Markdown")
 
 
 @dp.callback_query(F.message.chat.type == "private", F.data.startswith("item_"))
 async def show_item(callback: types.CallbackQuery, state: FSMContext):
-    product_id = int(callback.data.split("_", 1)[1])
-    item = get_product_by_id(product_id)
-    if not item:
-        return
+    await send_item_card(callback.message, int(callback.data.split("_", 1)[1]), state)
 
-    weights = item['weights']
-    current_cat = next(cat for cat in CATALOG if any(i['id'] == product_id for i in CATALOG[cat]))
-    await state.update_data(current_cat=current_cat)
 
-    if len(weights) == 1:
-        weight = weights[0]
-        await state.update_data(selected_item={"product_id": product_id, "weight": weight})
-        await state.set_state(OrderStates.entering_quantity)
+async def answer_text(message: types.Message, text: str, **kwargs):
+    return await message.answer(text, **kwargs)
 
-        caption = f"🍞 *{item['name']}*\n\n📋 {item['composition']}\n\nВведите количество (целое число):"
 
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🔙 Назад", callback_data=f"cat_{current_cat}")]
-        ])
+async def answer_photo(message: types.Message, photo, caption: str, **kwargs):
+    return await message.answer_photo(photo, caption=caption, **kwargs)
 
-        await callback.message.delete()
-        img_url = item['image_url']
-        if not (img_url.startswith("http") and any(
-                img_url.lower().endswith(ext) for ext in [".jpg", ".jpeg", ".png", ".webp", ".gif"])):
-            img_url = "https://via.placeholder.com/300x300.png?text=Хлеб"
 
-        try:
-            await bot.send_photo(callback.message.chat.id, img_url, caption=caption, reply_markup=keyboard,
-                                 parse_mode="Markdown")
-        except:
-            await bot.send_message(callback.message.chat.id, caption, reply_markup=keyboard, parse_mode="Markdown")
+async def send_item_card(message: types.Message, product_id: int, state: FSMContext):
+    # Из меню карточка заменяет сообщение бота; по deep-link message — это /start пользователя, шлём новую
+    item = CATALOG.get(product_id)
+    if not item:
+        return
+    card = RENDER.item(product_id, CATALOG)
+
+    if card.single_weight:
+        await state.update_data(current_cat=item.category,
+                                selected_item={"product_id": product_id, "weight": item.weights[0]})
+        await state.set_state(OrderStates.entering_quantity)
     else:
-        keyboard = []
-        for w in weights:
-            keyboard.append([
-                InlineKeyboardButton(
-                    text=w,
-                    callback_data=f"add_{product_id}_{w}"
-                )
-            ])
-        keyboard.append([InlineKeyboardButton(text="🔙 Назад", callback_data=f"cat_{current_cat}")])
-        caption = f"🍞 *{item['name']}*\n\n📋 {item['composition']}"
-
-        await callback.message.delete()
-        img_url = item['image_url']
-        if not (img_url.startswith("http") and any(
-                img_url.lower().endswith(ext) for ext in [".jpg", ".jpeg", ".png", ".webp", ".gif"])):
-            img_url = "https://via.placeholder.com/300x300.png?text=Хлеб"
+        await state.update_data(current_cat=item.category)
+
+    # Сначала file_id, затем локальная миниатюра; если её ещё нет — карточка без фото, на CDN не ходим
+    photo = None
+    if card.image_url:
+        thumbnail = IMAGES.path(card.image_url)
+        photo = PHOTOS.get(product_id, card.image_url) or (FSInputFile(thumbnail) if thumbnail else None)
+    if message.from_user and message.from_user.id == bot.id:
+        show_text, show_photo = replace_message, replace_with_photo
+    else:
+        show_text, show_photo = answer_text, answer_photo
+    if photo is None:
+        await show_text(message, card.caption, reply_markup=card.keyboard, parse_mode="Markdown")
+        return
+    try:
+        msg = await show_photo(message, photo, card.caption, reply_markup=card.keyboard, parse_mode="Markdown")
+        if msg.photo:
+            await PHOTOS.put(product_id, card.image_url, msg.photo[-1].file_id)
+    except Exception as e:
+        logging.warning(f"Не удалось отправить фото товара {product_id}: {e}")
+        metrics.PHOTO_FALLBACKS.inc()
+        if isinstance(photo, str):
+            await PHOTOS.forget(product_id)
+        await show_text(message, card.caption, reply_markup=card.keyboard, parse_mode="Markdown")
 
-        try:
-            await bot.send_photo(callback.message.chat.id, img_url, caption=caption,
-                                 reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard), parse_mode="Markdown")
-        except:
-            await bot.send_message(callback.message.chat.id, caption,
-                                   reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-                                   parse_mode="Markdown")
+
+@dp.inline_query()
+async def inline_search(query: InlineQuery):
+    # Inline-режим должен быть включён у бота в @BotFather (/setinline)
+    me = await bot.me()
+    results, next_offset = SEARCH.page(query.query, query.offset, CATALOG, me.username)
+    await query.answer(results, cache_time=SEARCH_CACHE_TIME, next_offset=next_offset)
 
 
 @dp.callback_query(F.message.chat.type == "private", F.data.startswith("add_"))
@@ -380,23 +526,17 @@ async def ask_quantity(callback: types.CallbackQuery, state: FSMContext):
     parts = callback.data.split("_", 2)[1:]
     product_id = int(parts[0])
     weight = parts[1]
-    item = get_product_by_id(product_id)
+    item = CATALOG.get(product_id)
     if not item:
         return
 
     await state.update_data(selected_item={"product_id": product_id, "weight": weight})
     await state.set_state(OrderStates.entering_quantity)
 
-    current_cat = (await state.get_data()).get("current_cat", "")
-
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Назад", callback_data=f"item_{product_id}")]
-    ])
-
     await bot.send_message(
         callback.message.chat.id,
-        f"📦 *{item['name']}* ({weight})\n\nВведите количество (целое число):",
-        reply_markup=keyboard,
+        f"📦 *{item.name}* ({weight})\n\nВведите количество (целое число):",
+        reply_markup=RENDER.item(product_id, CATALOG).quantity_keyboard,
         parse_mode="Markdown"
     )
 
@@ -419,24 +559,22 @@ async def add_to_cart_with_quantity(message: types.Message, state: FSMContext):
 
     product_id = item_data["product_id"]
     weight = item_data["weight"]
-    item = get_product_by_id(product_id)
+    item = CATALOG.get(product_id)
     if not item:
         await message.answer("Ошибка: товар не найден.")
         await state.set_state(None)
         return
 
-    price = item['prices'].get(weight, 0)
+    price = item.price(weight)
     total_price = price * quantity
 
-    cart = data.get("cart") or []
-    cart.append((product_id, weight, price, quantity))
-    await state.update_data(cart=cart)
-
-    await state.update_data(selected_item=None)
+    cart = Cart.from_state(data.get("cart"))
+    cart.add(product_id, weight, price, quantity)
+    await state.update_data(cart=cart.to_state(), selected_item=None)
     await state.set_state(None)
 
     await message.answer(
-        f"Добавлено: *{item['name']}* ({weight}) × {quantity} — {total_price / 100:.0f}₽",
+        f"Добавлено: *{item.name}* ({weight}) × {quantity} — {total_price / 100:.0f}₽",
         parse_mode="Markdown"
     )
 
@@ -446,57 +584,54 @@ async def add_to_cart_with_quantity(message: types.Message, state: FSMContext):
 @dp.callback_query(F.message.chat.type == "private", F.data == "cart_view")
 async def view_cart(callback: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    cart = data.get("cart") or []
+    cart = Cart.from_state(data.get("cart"))
+    notes = cart.revalidate(CATALOG)
     if not cart:
-        await callback.message.delete()
-        await bot.send_message(callback.message.chat.id, "🛒 Ваша корзина пуста.",
-                               reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                                   [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_menu")]
-                               ]))
+        if notes:
+            await state.update_data(cart=None)
+        await replace_message(callback.message, "🛒 Ваша корзина пуста.", reply_markup=BACK_TO_MENU)
         return
 
-    total = sum(price * qty for _, _, price, qty in cart)
-    text = "🛒 *Ваша корзина:*\n\n"
-    for product_id, weight, price, qty in cart:
-        item = get_product_by_id(product_id)
-        if item:
-            text += f"• {item['name']} ({weight}) × {qty} — 💰 {(price * qty) / 100:.0f}₽\n"
-    text += f"\n💵 *Итого:* {total / 100:.0f}₽"
+    text = "🛒 *Ваша корзина:*\n\n" + cart.summary(CATALOG) + f"\n\n💵 *Итого:* {cart.total / 100:.0f}₽"
+    if notes:
+        text = "⚠️ *Каталог обновился:*\n" + "\n".join(notes) + "\n\n" + text
+        await state.update_data(cart=cart.to_state())
     keyboard = [
         [InlineKeyboardButton(text="✅ Оформить заказ", callback_data="start_order")],
         [InlineKeyboardButton(text="🗑 Очистить корзину", callback_data="clear_cart")],
         [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_menu")]
     ]
 
-    await callback.message.delete()
-    await bot.send_message(callback.message.chat.id, text, reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-                           parse_mode="Markdown")
+    await replace_message(callback.message, text, reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
+                          parse_mode="Markdown")
 
 
 @dp.callback_query(F.message.chat.type == "private", F.data == "clear_cart")
 async def clear_cart(callback: types.CallbackQuery, state: FSMContext):
-    await state.update_data(cart=[])
-    await callback.message.delete()
-    await bot.send_message(callback.message.chat.id, "🛒 Корзина очищена.", reply_markup=get_main_menu())
+    await state.update_data(cart=None)
+    await replace_message(callback.message, "🛒 Корзина очищена.", reply_markup=get_main_menu())
 
 
 @dp.callback_query(F.message.chat.type == "private", F.data == "start_order")
 async def start_order(callback: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    cart = data.get("cart") or []
+    cart = Cart.from_state(data.get("cart"))
+    notes = cart.revalidate(CATALOG)
     if not cart:
+        await state.update_data(cart=None)
         await callback.answer("🛒 Корзина пуста!", show_alert=True)
         return
+    if notes:
+        await callback.answer("⚠️ Каталог обновился:\n" + "\n".join(notes), show_alert=True)
 
-    # сохраняем order_total с учётом количества
-    order_total = sum(price * qty for _, _, price, qty in cart)
-    await state.update_data(order_total=order_total, cart=cart)
+    # Текст заказа и позиции чека рендерятся здесь один раз и дальше берутся из FSM подтверждением и оплатой
+    cart.summary(CATALOG)
+    cart.receipt(CATALOG, CURRENCY)
+    await state.update_data(order_total=cart.total, cart=cart.to_state())
     await state.set_state(OrderStates.choosing_delivery)
 
-    await callback.message.delete()
-    await bot.send_message(callback.message.chat.id, "🚚 *Выберите способ доставки:*",
-                           reply_markup=get_delivery_keyboard(),
-                           parse_mode="Markdown")
+    await replace_message(callback.message, "🚚 *Выберите способ доставки:*",
+                          reply_markup=get_delivery_keyboard(), parse_mode="Markdown")
 
 
 @dp.callback_query(F.message.chat.type == "private", F.data.startswith("delivery_"))
@@ -516,10 +651,9 @@ async def choose_delivery(callback: types.CallbackQuery, state: FSMContext):
     )
     await state.set_state(OrderStates.entering_phone)
 
-    await callback.message.delete()
-    await bot.send_message(callback.message.chat.id,
-                           f"🚚 *Доставка:* {delivery['name']}\n💰 Цена: {'бесплатно' if delivery_price == 0 else f'{delivery_price / 100:.0f}₽'}\n\n☎️ Введите номер телефона:",
-                           parse_mode="Markdown")
+    await replace_message(callback.message,
+                          f"🚚 *Доставка:* {delivery['name']}\n💰 Цена: {'бесплатно' if delivery_price == 0 else f'{delivery_price / 100:.0f}₽'}\n\n☎️ Введите номер телефона:",
+                          parse_mode="Markdown")
 
 
 @dp.message(F.chat.type == "private", StateFilter(OrderStates.entering_phone))
@@ -568,12 +702,7 @@ async def enter_address(message: types.Message, state: FSMContext):
 
 async def show_confirmation(message: types.Message, state: FSMContext):
     data = await state.get_data()
-    cart = data.get("cart") or []
-    # products_text с учётом количества
-    products_text = "\n".join(
-        f"• {get_product_by_id(pid)['name']} ({w}) × {qty} — {(price * qty) / 100:.0f}₽"
-        for pid, w, price, qty in cart
-    )
+    products_text = Cart.from_state(data.get("cart")).summary(CATALOG)
     total = data.get("order_total", 0)
     delivery_price = data.get("delivery_price", 0)
     final_total = data.get("final_total", 0)
@@ -605,33 +734,33 @@ async def show_confirmation(message: types.Message, state: FSMContext):
 @dp.callback_query(F.message.chat.type == "private", F.data == "confirm_payment")
 async def confirm_payment(callback: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    cart = data.get("cart") or []
+    cart = Cart.from_state(data.get("cart"))
+    notes = cart.revalidate(CATALOG)
     delivery_price = data.get("delivery_price", 0)
     delivery_option = data.get("delivery_option", "")
 
+    if notes:
+        # Цены поменялись после подтверждения — не выставляем счёт по старым, показываем заказ заново
+        await state.update_data(cart=cart.to_state(), order_total=cart.total, final_total=cart.total + delivery_price)
+        await callback.message.answer("⚠️ *Каталог обновился:*\n" + "\n".join(notes), parse_mode="Markdown")
+        if not cart:
+            await state.set_state(None)
+            await callback.message.answer("🛒 Корзина пуста.", reply_markup=get_main_menu())
+            return
+        await show_confirmation(callback.message, state)
+        return
+
     # Строим prices как список LabeledPrice с суммами в копейках
-    prices = []
-    for pid, weight, price, qty in cart:
-        item = get_product_by_id(pid)
-        if item:
-            item_amount = price * qty  # в копейках
-            prices.append(LabeledPrice(label=f"{item['name']} ({weight}) x {qty}", amount=item_amount))
+    prices = [
+        LabeledPrice(label=f"{CATALOG.get(pid).name} ({weight}) x {qty}", amount=price * qty)
+        for pid, weight, price, qty in cart
+    ]
 
     if delivery_price > 0:
         prices.append(LabeledPrice(label=f"Доставка: {delivery_option}", amount=delivery_price))
 
-    # Строим receipt items для provider_data
-    items = []
-    for pid, weight, price, qty in cart:
-        item = get_product_by_id(pid)
-        if item:
-            item_unit_rub = price / 100
-            items.append({
-                "description": f"{item['name']} ({weight})",
-                "quantity": str(qty),
-                "amount": {"value": f"{item_unit_rub:.2f}", "currency": CURRENCY},
-                "vat_code": 1
-            })
+    # Позиции чека для provider_data берутся из корзины, доставка добавляется отдельно
+    items = list(cart.receipt(CATALOG, CURRENCY))
 
     if delivery_price > 0:
         delivery_unit_rub = delivery_price / 100
@@ -651,7 +780,8 @@ async def confirm_payment(callback: types.CallbackQuery, state: FSMContext):
         chat_id=callback.message.chat.id,
         title="💳 Оплата заказа",
         description="Хлеб + доставка",
-        payload="order_paid",
+        payload=cart.invoice_payload(INVOICE_SECRET, callback.from_user.id, data.get("delivery_key", ""),
+                                     delivery_price),
         provider_token=PROVIDER_TOKEN,
         currency=CURRENCY,
         prices=prices,
@@ -675,31 +805,42 @@ async def cancel_order(callback: types.CallbackQuery, state: FSMContext):
         order_total=None
     )
     await state.set_state(None)
-    await callback.message.delete()
-    await bot.send_message(callback.message.chat.id, "❌ Заказ отменён.", reply_markup=get_main_menu())
+    await replace_message(callback.message, "❌ Заказ отменён.", reply_markup=get_main_menu())
 
 
 @dp.pre_checkout_query()
-async def process_pre_checkout_query(pre_checkout_query: PreCheckoutQuery):
+async def process_pre_checkout_query(pre_checkout_query: PreCheckoutQuery, state: FSMContext):
+    try:
+        error = await asyncio.wait_for(check_pre_checkout(pre_checkout_query, state), PRE_CHECKOUT_TIMEOUT)
+    except asyncio.TimeoutError:
+        error = "Не удалось проверить заказ. Попробуйте оплатить ещё раз."
+    if error:
+        logging.warning(f"Оплата отклонена для {pre_checkout_query.from_user.id}: {error}")
+        await bot.answer_pre_checkout_query(pre_checkout_query.id, ok=False, error_message=error)
+        return
     await bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
 
 
+async def check_pre_checkout(query: PreCheckoutQuery, state: FSMContext):
+    if query.currency != CURRENCY:
+        return STALE_INVOICE
+    data = await state.get_data()
+    return Cart.from_state(data.get("cart")).check_invoice(
+        query.invoice_payload, INVOICE_SECRET, query.from_user.id, query.total_amount, CATALOG, DELIVERY_PRICES)
+
+
 @dp.message(F.chat.type == "private", F.successful_payment)
 async def process_successful_payment(message: types.Message, state: FSMContext):
     data = await state.get_data()
     # total в копейках в успешной оплате
     total = message.successful_payment.total_amount // 100
-    order_id = int(time.time())
+    order_id = OUTBOX.next_order_id()
 
-    cart = data.get("cart") or []
-    products_text = "\n".join(
-        f"• {get_product_by_id(pid)['name']} ({w}) × {qty} — {(price * qty) / 100:.0f}₽"
-        for pid, w, price, qty in cart
-    )
+    cart = Cart.from_state(data.get("cart"))
+    products_text = cart.summary(CATALOG)
 
     # === СООБЩЕНИЕ АДМИНУ (без эмодзи) ===
-    if ADMIN_ID:
-        admin_text = f"""
+    admin_text = f"""
 Новый заказ #{order_id}!
 
 Заказ #{order_id}
@@ -712,58 +853,44 @@ Email: {data.get('email')}
 Адрес: {data.get('address')}
 Сумма за товары: {data.get('order_total', 0) / 100:.0f}₽
 Итого: {total:.0f}₽
-        """.strip()
-        try:
-            await bot.send_message(ADMIN_ID, admin_text)
-        except Exception as e:
-            logging.error(f"Не удалось отправить админу: {e}")
-
-    # === ЗАПИСЬ В GOOGLE SHEETS (без эмодзи в ячейках) ===
-    service = get_sheets_service()
-    if service:
-        # формируем список товаров с количеством
-        items_list = ", ".join(f"{get_product_by_id(pid)['name']} ({w}) × {qty}" for pid, w, _, qty in cart)
-        row = [
-            order_id,
-            items_list,
-            data.get("delivery_option", ""),
-            data.get("phone", ""),
-            data.get("email", ""),
-            data.get("address", ""),
-            f"{data.get('order_total', 0) / 100:.0f}",
-            f"{data.get('delivery_price', 0) / 100:.0f}",
-            f"{total:.0f}",
-            datetime.now().strftime("%Y-%m-%d %H:%M")
-        ]
-        try:
-            service.spreadsheets().values().append(
-                spreadsheetId=SHEET_ID,
-                range="A1",
-                valueInputOption="RAW",
-                body={"values": [row]}
-            ).execute()
-        except Exception as e:
-            logging.error(f"Ошибка записи: {e}")
+    """.strip()
 
-    # === УДАЛЕНИЕ Системных/старых сообщений (по возможности) ===
-    try:
-        for i in range(message.message_id - 20, message.message_id + 1):
-            try:
-                await bot.delete_message(message.chat.id, i)
-            except:
-                pass
-    except:
-        pass
+    # === СТРОКА ДЛЯ GOOGLE SHEETS (без эмодзи в ячейках) ===
+    # формируем список товаров с количеством
+    items_list = cart.items_list(CATALOG)
+    row = [
+        order_id,
+        items_list,
+        data.get("delivery_option", ""),
+        data.get("phone", ""),
+        data.get("email", ""),
+        data.get("address", ""),
+        f"{data.get('order_total', 0) / 100:.0f}",
+        f"{data.get('delivery_price', 0) / 100:.0f}",
+        f"{total:.0f}",
+        datetime.now().strftime("%Y-%m-%d %H:%M")
+    ]
+
+    # Сначала заказ надёжно ложится в журнал, рассылкой админу и в таблицу занимается OUTBOX
+    await OUTBOX.record(order_id, {
+        "chat_id": message.chat.id,
+        "charge_id": message.successful_payment.telegram_payment_charge_id,
+        "admin_text": admin_text,
+        "row": row
+    }, targets=["admin", "sheet"])
 
     await bot.send_message(message.chat.id,
                            f"✅ *Оплата прошла успешно!*\n\n📦 Заказ №{order_id} принят.\nМы скоро свяжемся с вами ☎️",
                            reply_markup=get_main_menu(), parse_mode="Markdown")
     await state.clear()
 
+    # === УДАЛЕНИЕ сообщений оформления заказа (в фоне, после подтверждения) ===
+    sent_ids = (data.get(SENT_IDS_KEY) or []) + [message.message_id]
+    run_in_background(delete_messages(bot, message.chat.id, sent_ids))
+
 
 @dp.callback_query(F.message.chat.type == "private", F.data == "back_to_menu")
 async def back_to_menu(callback: types.CallbackQuery):
-    await callback.message.delete()
-    await bot.send_message(callback.message.chat.id, "🍞 Выберите категорию:", reply_markup=get_main_menu())
+    await replace_message(callback.message, "🍞 Выберите категорию:", reply_markup=get_main_menu())
 
 
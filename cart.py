@@ -0,0 +1,174 @@
+import hmac
+import base64
+import hashlib
+from typing import Dict, Iterator, List, Optional, Tuple
+from catalog import Catalog
+
+# === Корзина ===
+# Строки корзины ключуются по (товар, вес): повторное добавление того же хлеба увеличивает количество.
+# Сумма поддерживается при каждом изменении, а текст состава заказа и позиции чека рендерятся один раз
+# и хранятся в FSM вместе с корзиной, пока строки не поменяются.
+Line = Tuple[int, str, int, int]  # product_id, weight, price, quantity
+
+# === Подпись счёта ===
+# В payload счёта (до 128 байт) кладётся не корзина, а её отпечаток: версия, доставка, итог в копейках
+# и обрезанный HMAC от пользователя и строк корзины. Перед оплатой его сверяют с корзиной в FSM и живыми ценами.
+PAYLOAD_VERSION = "c1"
+SIGNATURE_BYTES = 12
+STALE_INVOICE = "Корзина изменилась после выставления счёта. Оформите заказ заново."
+ITEM_GONE = "Часть товаров больше недоступна. Оформите заказ заново."
+PRICE_CHANGED = "Цены обновились. Оформите заказ заново, чтобы оплатить по актуальным."
+
+
+class Cart:
+    __slots__ = ("lines", "total", "_summary", "_receipt")
+
+    def __init__(self):
+        self.lines: Dict[Tuple[int, str], List[int]] = {}  # (product_id, weight) -> [price, quantity]
+        self.total = 0
+        self._summary: Optional[str] = None
+        self._receipt: Optional[List[Dict]] = None
+
+    @classmethod
+    def from_state(cls, state) -> "Cart":
+        # В FSM: {"lines": [[id, вес, цена, кол-во], ...], "total": ..., "summary": ..., "receipt": ...};
+        # старые корзины — просто список кортежей, дубли в них склеиваются
+        cart = cls()
+        if not state:
+            return cart
+        if isinstance(state, dict):
+            for pid, weight, price, qty in state.get("lines") or []:
+                cart.lines[(pid, weight)] = [price, qty]
+            cart.total = state.get("total", 0)
+            cart._summary = state.get("summary")
+            cart._receipt = state.get("receipt")
+            return cart
+        for pid, weight, price, qty in state:
+            cart.add(pid, weight, price, qty)
+        return cart
+
+    def to_state(self) -> Optional[Dict]:
+        if not self.lines:
+            return None
+        return {
+            "lines": [[pid, weight, price, qty] for (pid, weight), (price, qty) in self.lines.items()],
+            "total": self.total,
+            "summary": self._summary,
+            "receipt": self._receipt,
+        }
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __iter__(self) -> Iterator[Line]:
+        for (pid, weight), (price, qty) in self.lines.items():
+            yield pid, weight, price, qty
+
+    def _changed(self):
+        self._summary = None
+        self._receipt = None
+
+    def add(self, product_id: int, weight: str, price: int, quantity: int):
+        line = self.lines.get((product_id, weight))
+        if line is None:
+            self.lines[(product_id, weight)] = [price, quantity]
+            self.total += price * quantity
+        else:
+            # Цена берётся последняя: её только что показали пользователю
+            self.total += price * (line[1] + quantity) - line[0] * line[1]
+            line[0] = price
+            line[1] += quantity
+        self._changed()
+
+    def revalidate(self, catalog: Catalog) -> List[str]:
+        # Сверяем корзину с текущим каталогом: цены берём актуальные, пропавшие товары убираем
+        notes = []
+        for (pid, weight), line in list(self.lines.items()):
+            price, qty = line
+            item = catalog.get(pid)
+            if not item or weight not in item.prices:
+                notes.append(f"• {item.name if item else 'Товар'} ({weight}) больше недоступен")
+                del self.lines[(pid, weight)]
+                self.total -= price * qty
+                continue
+            current = item.price(weight)
+            if current != price:
+                notes.append(f"• {item.name} ({weight}): {price / 100:.0f}₽ → {current / 100:.0f}₽")
+                line[0] = current
+                self.total += (current - price) * qty
+        if notes:
+            self._changed()
+        return notes
+
+    def _name(self, catalog: Catalog, product_id: int) -> str:
+        # Название входит в stable id товара, так что для живого id оно не меняется
+        item = catalog.get(product_id)
+        return item.name if item else "Товар"
+
+    def summary(self, catalog: Catalog) -> str:
+        # Состав заказа без эмодзи: тот же текст идёт в корзину, подтверждение и сообщение админу
+        if self._summary is None:
+            self._summary = "\n".join(
+                f"• {self._name(catalog, pid)} ({weight}) × {qty} — {price * qty / 100:.0f}₽"
+                for pid, weight, price, qty in self
+            )
+        return self._summary
+
+    def receipt(self, catalog: Catalog, currency: str) -> List[Dict]:
+        # Позиции чека для provider_data, без доставки
+        if self._receipt is None:
+            self._receipt = [
+                {
+                    "description": f"{self._name(catalog, pid)} ({weight})",
+                    "quantity": str(qty),
+                    "amount": {"value": f"{price / 100:.2f}", "currency": currency},
+                    "vat_code": 1
+                }
+                for pid, weight, price, qty in self
+            ]
+        return self._receipt
+
+    def items_list(self, catalog: Catalog) -> str:
+        return ", ".join(f"{self._name(catalog, pid)} ({weight}) × {qty}" for pid, weight, _, qty in self)
+
+    def live_total(self, catalog: Catalog) -> Optional[int]:
+        # Сумма по текущим ценам каталога; None, если товар или вес пропал
+        total = 0
+        for (pid, weight), line in self.lines.items():
+            item = catalog.get(pid)
+            if item is None or weight not in item.prices:
+                return None
+            total += item.price(weight) * line[1]
+        return total
+
+    def _signature(self, secret: bytes, user_id: int, delivery_key: str, amount: int) -> str:
+        mac = hmac.new(secret, f"{user_id}|{delivery_key}|{amount}".encode(), hashlib.sha256)
+        for (pid, weight), (price, qty) in self.lines.items():
+            mac.update(f"|{pid}:{weight}:{price}:{qty}".encode())
+        return base64.urlsafe_b64encode(mac.digest()[:SIGNATURE_BYTES]).decode()
+
+    def invoice_payload(self, secret: bytes, user_id: int, delivery_key: str, delivery_price: int) -> str:
+        amount = self.total + delivery_price
+        return f"{PAYLOAD_VERSION}:{delivery_key}:{amount}:{self._signature(secret, user_id, delivery_key, amount)}"
+
+    def check_invoice(self, payload: str, secret: bytes, user_id: int, amount: int, catalog: Catalog,
+                      delivery_prices: Dict[str, int]) -> Optional[str]:
+        # None — можно списывать; иначе текст отказа для пользователя
+        parts = payload.split(":")
+        if len(parts) != 4 or parts[0] != PAYLOAD_VERSION or not parts[2].isdigit():
+            return STALE_INVOICE
+        _, delivery_key, signed_amount, signature = parts
+        signed_amount = int(signed_amount)
+        if not self.lines or signed_amount != amount or delivery_key not in delivery_prices:
+            return STALE_INVOICE
+        if not hmac.compare_digest(signature, self._signature(secret, user_id, delivery_key, signed_amount)):
+            return STALE_INVOICE
+        live = self.live_total(catalog)
+        if live is None:
+            return ITEM_GONE
+        if live + delivery_prices[delivery_key] != amount:
+            return PRICE_CHANGED
+        return None
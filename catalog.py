@@ -0,0 +1,141 @@
+import zlib
+import itertools
+from typing import Dict, List, Optional, Set, Tuple
+
+# === Витрина: какие вкладки и товары берём ===
+# Общее для Selenium- и HTTP-парсера, поэтому живёт здесь, а не рядом с Selenium-кодом в scraper.py
+CATEGORIES = {
+    'Белый хлеб': 'Белый хлеб',
+    'Серый хлеб': 'Серый хлеб',
+    'Хлеб с добавками': 'Хлеб с добавками'
+}
+SKIP_WORDS = ['СТАЖИРОВКА', 'КУРС', 'ТОРТ', 'ПОДАРОК', 'СЕРТИФИКАТ', 'НАБОР']
+PLACEHOLDER_IMAGE = "https://via.placeholder.com/300x300.png?text=Хлеб"  # так парсеры помечают товар без картинки
+
+
+def is_excluded(name: str) -> bool:
+    if not name or any(skip in name.upper() for skip in SKIP_WORDS):
+        return True
+    return "кекс" in name.lower()
+
+
+# Номер версии растёт при каждой сборке каталога — по нему сбрасываются кэши, завязанные на каталог
+_versions = itertools.count(1)
+
+
+def stable_product_id(category: str, name: str, taken: Set[int]) -> int:
+    # id выводится из категории и названия, поэтому не меняется между перепарсингами и корзины не «съезжают»
+    product_id = zlib.crc32(f"{category}\x00{name}".encode("utf-8")) or 1
+    while product_id in taken:
+        product_id = product_id % 0xFFFFFFFF + 1
+    return product_id
+
+
+class Product:
+    __slots__ = ("id", "name", "weights", "prices", "composition", "image_url", "category")
+
+    def __init__(self, id: int, name: str, weights: List[str], prices: Dict[str, int],
+                 composition: str, image_url: str, category: str):
+        self.id = id
+        self.name = name
+        self.weights = tuple(weights)
+        self.prices = prices
+        self.composition = composition
+        self.image_url = image_url
+        self.category = category
+
+    def price(self, weight: str) -> int:
+        return self.prices.get(weight, 0)
+
+    def same_as(self, other: "Product") -> bool:
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "weights": list(self.weights),
+            "prices": dict(self.prices),
+            "composition": self.composition,
+            "image_url": self.image_url
+        }
+
+
+class Catalog:
+    # Каталог собирается один раз при загрузке и дальше только читается, поэтому его можно подменять целиком
+    __slots__ = ("version", "timestamp", "categories", "products")
+
+    def __init__(self, data: Optional[Dict[str, List[Dict]]] = None, timestamp: float = 0.0):
+        self.version = next(_versions)
+        self.timestamp = timestamp
+        self.categories: Dict[str, Tuple[Product, ...]] = {}
+        self.products: Dict[int, Product] = {}
+        for category, items in (data or {}).items():
+            products = tuple(
+                Product(item["id"], item["name"], item["weights"], item["prices"],
+                        item["composition"], item["image_url"], category)
+                for item in items
+            )
+            self.categories[category] = products
+            for product in products:
+                self.products[product.id] = product
+
+    def __bool__(self):
+        return bool(self.products)
+
+    def __contains__(self, category: str):
+        return category in self.categories
+
+    def get(self, product_id: int) -> Optional[Product]:
+        return self.products.get(product_id)
+
+    def category_of(self, product_id: int) -> Optional[str]:
+        product = self.products.get(product_id)
+        return product.category if product else None
+
+    def items(self, category: str) -> Tuple[Product, ...]:
+        return self.categories.get(category, ())
+
+    def to_dict(self) -> Dict[str, List[Dict]]:
+        return {category: [p.to_dict() for p in products] for category, products in self.categories.items()}
+
+    def to_rows(self) -> List[tuple]:
+        # Плоские кортежи для компактного снимка, порядок полей — как в Product.__slots__
+        return [(p.id, p.name, p.weights, p.prices, p.composition, p.image_url, p.category)
+                for products in self.categories.values() for p in products]
+
+    @classmethod
+    def from_rows(cls, rows: List[tuple], timestamp: float = 0.0) -> "Catalog":
+        catalog = cls(timestamp=timestamp)
+        grouped: Dict[str, List[Product]] = {}
+        for row in rows:
+            product = Product(*row)
+            grouped.setdefault(product.category, []).append(product)
+            catalog.products[product.id] = product
+        catalog.categories = {category: tuple(products) for category, products in grouped.items()}
+        return catalog
+
+
+class CatalogDiff:
+    __slots__ = ("old_version", "added", "removed", "price_changed", "changed", "categories")
+
+    def __init__(self, old: Catalog, new: Catalog):
+        self.old_version = old.version
+        self.added = [pid for pid in new.products if pid not in old.products]
+        self.removed = [pid for pid in old.products if pid not in new.products]
+        common = [pid for pid in new.products if pid in old.products]
+        self.price_changed = [pid for pid in common if old.products[pid].prices != new.products[pid].prices]
+        # Любые изменения товара, включая цену, — по ним сбрасываются карточки
+        self.changed = [pid for pid in common if not old.products[pid].same_as(new.products[pid])]
+        # Категории, у которых поменялся состав, порядок или кнопки товаров
+        self.categories = {
+            cat for cat in set(old.categories) | set(new.categories)
+            if [(p.id, p.name, p.prices) for p in old.items(cat)] != [(p.id, p.name, p.prices) for p in new.items(cat)]
+        }
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed or self.categories)
+
+    def __str__(self):
+        return (f"добавлено {len(self.added)}, удалено {len(self.removed)}, "
+                f"изменено {len(self.changed)} (из них цены: {len(self.price_changed)})")
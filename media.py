@@ -0,0 +1,222 @@
+import io
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+import aiohttp
+from aiogram import Bot
+from aiogram.types import FSInputFile
+from snapshot import CACHE_FILE
+
+# === Кэш file_id фотографий товаров ===
+# После первой удачной отправки Telegram отдаёт file_id, по которому миниатюру не нужно заливать заново
+# Лежит рядом с catalog.json: на общем томе кэш переживает передеплой вместе с каталогом
+PHOTO_CACHE_FILE = os.getenv("PHOTO_CACHE_FILE", os.path.join(os.path.dirname(CACHE_FILE), "photo_ids.json"))
+WARMUP_DELAY = 0.5  # пауза между загрузками при прогреве, чтобы не упереться в лимиты
+
+
+class PhotoCache:
+    def __init__(self, path: str = PHOTO_CACHE_FILE):
+        self.path = path
+        self.entries: Dict[int, Tuple[str, str]] = {}  # product_id -> (image_url, file_id)
+        # Параллельные put из разных хендлеров не должны писать один и тот же .tmp одновременно
+        self._lock = asyncio.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.entries = {int(pid): (e["url"], e["file_id"]) for pid, e in data.items()}
+        except Exception as e:
+            logging.warning(f"Не удалось прочитать кэш фото: {e}")
+
+    def dump(self) -> Dict:
+        return {str(pid): {"url": url, "file_id": file_id} for pid, (url, file_id) in self.entries.items()}
+
+    def save(self, data: Optional[Dict] = None):
+        data = self.dump() if data is None else data
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    async def _save(self):
+        # Снимок записей берём в event loop, в поток уходит уже готовый dict
+        data = self.dump()
+        async with self._lock:
+            await asyncio.to_thread(self.save, data)
+
+    def get(self, product_id: int, image_url: str) -> Optional[str]:
+        # file_id годится, только пока у товара та же картинка
+        entry = self.entries.get(product_id)
+        if entry and entry[0] == image_url:
+            return entry[1]
+        return None
+
+    async def put(self, product_id: int, image_url: str, file_id: str):
+        if self.entries.get(product_id) == (image_url, file_id):
+            return
+        self.entries[product_id] = (image_url, file_id)
+        await self._save()
+
+    async def forget(self, product_id: int):
+        if self.entries.pop(product_id, None):
+            await self._save()
+
+    async def prune(self, images: Dict[int, str]):
+        # Выкидываем записи удалённых товаров и товаров со сменившейся картинкой
+        stale = [pid for pid, (url, _) in self.entries.items() if images.get(pid) != url]
+        for pid in stale:
+            del self.entries[pid]
+        if stale:
+            await self._save()
+
+
+# === Локальные миниатюры товаров ===
+# После каждого обновления каталога картинки параллельно качаются с CDN, пережимаются в JPEG
+# не больше IMAGE_MAX_SIDE по длинной стороне и кладутся в IMAGE_DIR под именем sha256 содержимого.
+# Карточка товара заливает в Telegram локальный файл, дальше ходит по file_id: CDN при показе не нужен.
+IMAGE_DIR = os.getenv("IMAGE_DIR", "images")
+IMAGE_INDEX = "index.json"
+IMAGE_MAX_SIDE = 1280  # больше Telegram всё равно не показывает
+IMAGE_QUALITY = 82
+IMAGE_CONCURRENCY = 8  # одновременных загрузок с CDN
+# Перекодирование — в одном своём потоке: каждый новый поток malloc заводит себе арену и держит в ней
+# память полноразмерной картинки; в общем пуле asyncio.to_thread это +200 МБ, а быстрее не выходит
+IMAGE_CONVERSIONS = 1
+IMAGE_TIMEOUT = 30
+IMAGE_MAX_BYTES = 20 * 1024 * 1024
+IMAGE_GC_AGE = 24 * 3600  # файлы без ссылок удаляем не сразу: их может ещё показывать другой воркер
+
+
+def make_thumbnail(data: bytearray) -> bytes:
+    # webp, png с прозрачностью, gif — всё приводится к RGB JPEG, который Telegram принимает без вопросов.
+    # Pillow грузится только здесь, в потоке перекодирования, а не при старте бота
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        source.draft("RGB", (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))  # JPEG сразу декодируется в уменьшенном виде
+        image = ImageOps.exif_transpose(source)
+        transparent = image.mode in ("RGBA", "LA", "P")
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if transparent else "RGB")
+        # Сначала уменьшаем, потом подкладываем белый фон: копии делаются уже с маленькой картинки
+        image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS, reducing_gap=2.0)
+        if transparent:
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+class ImageStore:
+    def __init__(self, root: str = IMAGE_DIR):
+        self.root = root
+        self.index: Dict[str, str] = {}  # image_url -> имя файла миниатюры
+        self._lock = asyncio.Lock()
+        self._executor = ThreadPoolExecutor(IMAGE_CONVERSIONS, thread_name_prefix="thumbnails")
+        self.index.update(self._read_index())
+
+    def _read_index(self) -> Dict[str, str]:
+        try:
+            with open(os.path.join(self.root, IMAGE_INDEX), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logging.warning(f"Не удалось прочитать индекс миниатюр: {e}")
+            return {}
+
+    def path(self, image_url: str) -> Optional[str]:
+        name = self.index.get(image_url)
+        return os.path.join(self.root, name) if name else None
+
+    def _missing(self, urls: Iterable[str]) -> List[str]:
+        # Индекс общий с другими воркерами: сначала подхватываем то, что они уже скачали
+        self.index.update(self._read_index())
+        return [url for url in urls if not (url in self.index and os.path.exists(self.path(url)))]
+
+    def _store(self, data: bytearray) -> str:
+        thumbnail = make_thumbnail(data)
+        name = hashlib.sha256(thumbnail).hexdigest()[:32] + ".jpg"
+        path = os.path.join(self.root, name)
+        if not os.path.exists(path):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(thumbnail)
+            os.replace(tmp, path)
+        return name
+
+    def _save(self, index: Dict[str, str]):
+        path = os.path.join(self.root, IMAGE_INDEX)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        # Уборка: миниатюры, на которые больше никто не ссылается и которые давно не менялись
+        used = set(index.values())
+        expired = time.time() - IMAGE_GC_AGE
+        for entry in os.scandir(self.root):
+            if entry.name.endswith(".jpg") and entry.name not in used and entry.stat().st_mtime < expired:
+                os.remove(entry.path)
+
+    async def _fetch(self, session: aiohttp.ClientSession, downloads: asyncio.Semaphore, url: str) -> bool:
+        try:
+            data = bytearray()
+            async with downloads:
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        data += chunk
+                        if len(data) > IMAGE_MAX_BYTES:
+                            raise ValueError("файл больше допустимого")
+            name = await asyncio.get_running_loop().run_in_executor(self._executor, self._store, data)
+        except Exception as e:
+            logging.warning(f"Не удалось подготовить картинку {url}: {e}")
+            return False
+        self.index[url] = name
+        return True
+
+    async def sync(self, urls: Iterable[str]) -> int:
+        wanted = set(urls)
+        async with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            missing = await asyncio.to_thread(self._missing, wanted)
+            fetched = 0
+            if missing:
+                downloads = asyncio.Semaphore(IMAGE_CONCURRENCY)
+                timeout = aiohttp.ClientTimeout(total=IMAGE_TIMEOUT)
+                async with aiohttp.ClientSession(timeout=timeout) as session:
+                    results = await asyncio.gather(*(self._fetch(session, downloads, url) for url in missing))
+                fetched = sum(results)
+            self.index = {url: name for url, name in self.index.items() if url in wanted}
+            await asyncio.to_thread(self._save, dict(self.index))
+        logging.info(f"Миниатюры товаров: новых {fetched}, не удалось {len(missing) - fetched}, всего {len(self.index)}")
+        return fetched
+
+
+async def warm_up(bot: Bot, chat_id: int, cache: PhotoCache, store: ImageStore, images: Iterable[Tuple[int, str]]):
+    # Загружаем все ещё не закэшированные миниатюры в служебный чат и сразу удаляем сообщения
+    uploaded = 0
+    for product_id, image_url in images:
+        path = store.path(image_url)
+        if cache.get(product_id, image_url) or not path:
+            continue
+        try:
+            msg = await bot.send_photo(chat_id, FSInputFile(path), disable_notification=True)
+            await cache.put(product_id, image_url, msg.photo[-1].file_id)
+            uploaded += 1
+            await bot.delete_message(chat_id, msg.message_id)
+        except Exception as e:
+            logging.warning(f"Прогрев фото товара {product_id} не удался: {e}")
+        await asyncio.sleep(WARMUP_DELAY)
+    logging.info(f"Прогрев фото завершён, загружено: {uploaded}")
@@ -0,0 +1,231 @@
+import os
+import abc
+import json
+import time
+import bisect
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+# === Метрики в формате Prometheus ===
+# Свой минимальный реестр вместо prometheus_client: на горячем пути только perf_counter, bisect и сложение в dict,
+# отдаётся текстом на /metrics. С воркерами (UPDATE_WORKERS) каждый процесс помечает свои серии меткой process
+# и периодически сбрасывает их в METRICS_DIR, а принимающий процесс склеивает всё в один ответ.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SCRAPE_BUCKETS = (5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+_REGISTRY: List["_Metric"] = []
+_PROCESS: Tuple[Tuple[str, ...], Tuple[str, ...]] = ((), ())
+
+
+def set_process(name: str):
+    global _PROCESS
+    _PROCESS = (("process",), (name,))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    names, values = _PROCESS[0] + names, _PROCESS[1] + values
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        _REGISTRY.append(self)
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        pass
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labels, k)} {v}" for k, v in self.values.items()]
+
+
+class Gauge(_Metric):
+    # Значение можно выставлять явно или вычислять в момент чтения /metrics
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, func: Optional[Callable[[], float]] = None):
+        super().__init__(name, help)
+        self.func = func
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels((), ())} {self.func() if self.func else self.value}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # По каждому набору меток: счётчики по корзинам (не накопительные), сумма и количество
+        self.series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        names = self.labels + ("le",)
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {count}")
+        return lines
+
+
+def dump() -> Dict[str, List[str]]:
+    return {metric.name: metric.samples() for metric in _REGISTRY}
+
+
+def write(path: str, data: Dict[str, List[str]]):
+    # data снимается через dump() в event loop, запись можно отдать в поток
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def read(paths: Iterable[str]) -> List[Dict[str, List[str]]]:
+    dumps = []
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                dumps.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # воркер ещё не успел ничего записать
+    return dumps
+
+
+def render(others: Iterable[Dict[str, List[str]]] = ()) -> str:
+    # others — снимки других процессов: их серии идут в те же семейства, HELP и TYPE у семейства один
+    others = list(others)
+    lines = []
+    for metric in _REGISTRY:
+        lines += metric.render()
+        for other in others:
+            lines += other.get(metric.name, [])
+    return "\n".join(lines) + "\n"
+
+
+HANDLER_LATENCY = Histogram("bot_handler_seconds", "Время работы хендлера", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Исключения в хендлерах", ("handler",))
+API_LATENCY = Histogram("bot_api_request_seconds", "Время запроса к Bot API", ("method",))
+API_ERRORS = Counter("bot_api_errors_total", "Ошибки запросов к Bot API", ("method", "error"))
+STORAGE_LATENCY = Histogram("bot_fsm_storage_seconds", "Время операций FSM-хранилища", ("op",))
+SCRAPE_DURATION = Histogram("bot_scrape_seconds", "Длительность парсинга каталога", (), SCRAPE_BUCKETS)
+SCRAPE_FAILURES = Counter("bot_scrape_failures_total", "Неудачные парсинги каталога")
+PHOTO_FALLBACKS = Counter("bot_photo_fallbacks_total", "Карточки, отправленные текстом вместо фото")
+
+
+class HandlerTimer(BaseMiddleware):
+    # Внутренний middleware наблюдателя: к этому моменту фильтры уже выбрали хендлер, его имя и берём в метку
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, name)
+
+
+class ApiTimer(BaseRequestMiddleware):
+    # Ставится после RateLimiter, поэтому меряет сам запрос без ожидания в очереди, а каждый повтор считается отдельно
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> TelegramType:
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            API_LATENCY.observe(time.perf_counter() - started, name)
+
+
+class TimedStorage(BaseStorage):
+    # Обёртка над любым FSM-хранилищем (SQLite, Redis, память), прочие атрибуты пробрасываются как есть
+    def __init__(self, storage: BaseStorage):
+        self.storage = storage
+
+    def __getattr__(self, item):
+        return getattr(self.storage, item)
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        started = time.perf_counter()
+        try:
+            return await self.storage.set_state(key, state)
+        finally:
+            STORAGE_LATENCY.observe(time.perf_counter() - started, "set_state")
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        started = time.perf_counter()
+        try:
+            return await self.storage.get_state(key)
+        finally:
+            STORAGE_LATENCY.observe(time.perf_counter() - started, "get_state")
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        started = time.perf_counter()
+        try:
+            return await self.storage.set_data(key, data)
+        finally:
+            STORAGE_LATENCY.observe(time.perf_counter() - started, "set_data")
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            return await self.storage.get_data(key)
+        finally:
+            STORAGE_LATENCY.observe(time.perf_counter() - started, "get_data")
+
+    async def close(self) -> None:
+        await self.storage.close()
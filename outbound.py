@@ -0,0 +1,217 @@
+import time
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.methods import (DeleteMessage, DeleteMessages, EditMessageCaption, EditMessageMedia,
+                             EditMessageReplyMarkup, EditMessageText, SendInvoice, SendMessage, SendPhoto,
+                             TelegramMethod)
+from aiogram.methods.base import TelegramType
+from aiogram.types import InlineKeyboardMarkup, InputFile, InputMediaPhoto, Message, TelegramObject, Update
+
+# === Исходящие сообщения бота ===
+SENT_IDS_KEY = "sent_ids"
+MAX_TRACKED = 100  # столько последних сообщений бота помним на чат
+DELETE_CHUNK = 100  # лимит deleteMessages на один вызов
+TRACKED_METHODS = (SendMessage, SendPhoto, SendInvoice)
+
+# Лимиты Telegram: ~30 сообщений в секунду на бота и ~1 в секунду в один чат (с небольшим запасом на всплеск)
+GLOBAL_RATE = 30.0
+CHAT_RATE = 1.0
+CHAT_BURST = 3
+MAX_RETRIES = 3
+PRIORITY_METHODS = (SendInvoice,)  # answerPreCheckoutQuery без chat_id и так идёт мимо лимитера
+# Правки и удаления не новые сообщения: лимит 1 в секунду на чат к ним не применяется, только общий
+CHAT_EXEMPT_METHODS = (EditMessageText, EditMessageCaption, EditMessageMedia, EditMessageReplyMarkup,
+                       DeleteMessage, DeleteMessages)
+
+# Запросы, сделанные при обработке оплаты, идут вне общей очереди
+high_priority: ContextVar[bool] = ContextVar("high_priority", default=False)
+# Пользователь, чей апдейт сейчас обрабатывается: только его чат считается «перепиской оформления»
+update_user: ContextVar[Optional[int]] = ContextVar("update_user", default=None)
+
+
+class SentMessageTracker(BaseRequestMiddleware):
+    # Запоминает id отправленных ботом сообщений в данных FSM приватного чата,
+    # чтобы после оплаты удалить ровно их, а не перебирать id наугад. Считаются только ответы в чат
+    # пользователя, чей апдейт обрабатывается: уведомления о заказах и прогрев фото у админа сюда не попадают.
+    def __init__(self, storage: BaseStorage, skip_chats: Iterable[int] = ()):
+        self.storage = storage
+        self.skip_chats = set(skip_chats)
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> TelegramType:
+        result = await make_request(bot, method)
+        if (isinstance(method, TRACKED_METHODS) and isinstance(result, Message) and result.chat.type == "private"
+                and result.chat.id == update_user.get() and result.chat.id not in self.skip_chats):
+            try:
+                await self.remember(bot, result.chat.id, result.message_id)
+            except Exception as e:
+                logging.warning(f"Не удалось запомнить сообщение {result.message_id}: {e}")
+        return result
+
+    async def remember(self, bot: Bot, chat_id: int, message_id: int):
+        key = StorageKey(bot_id=bot.id, chat_id=chat_id, user_id=chat_id)
+        data = await self.storage.get_data(key)
+        data[SENT_IDS_KEY] = ((data.get(SENT_IDS_KEY) or []) + [message_id])[-MAX_TRACKED:]
+        await self.storage.set_data(key, data)
+
+
+async def delete_messages(bot: Bot, chat_id: int, message_ids: Iterable[int]):
+    # Пакетное удаление: по 100 id за вызов, пачки уходят параллельно
+    ids: List[int] = sorted(set(message_ids))
+    chunks = [ids[i:i + DELETE_CHUNK] for i in range(0, len(ids), DELETE_CHUNK)]
+    results = await asyncio.gather(*(bot.delete_messages(chat_id, chunk) for chunk in chunks),
+                                   return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logging.warning(f"Не удалось удалить сообщения в чате {chat_id}: {result}")
+
+
+class TokenBucket:
+    # Бакет с резервированием: токены могут уйти в минус, и каждый следующий запрос ждёт свою очередь
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def penalize(self, seconds: float):
+        # После 429 не даём бакету выдавать токены, пока не истечёт retry_after
+        self.tokens = min(self.tokens, -seconds * self.rate)
+        self.updated = time.monotonic()
+
+    def drain(self):
+        # Всплеск больше не положен: дальше запросы идут строго с темпом rate
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = time.monotonic()
+
+    def idle(self) -> bool:
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+
+class RateLimiter(BaseRequestMiddleware):
+    # Единая точка для всех исходящих запросов: глобальный и початовый лимиты, повторы по retry_after
+    def __init__(self, global_rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE, chat_burst: int = CHAT_BURST):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chats: Dict[Any, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if len(self.chats) > 10000:
+                self.chats = {cid: b for cid, b in self.chats.items() if not b.idle()}
+            bucket = self.chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> TelegramType:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # getUpdates, answerCallbackQuery и т.п. под лимиты сообщений не попадают
+            return await make_request(bot, method)
+
+        priority = high_priority.get() or isinstance(method, PRIORITY_METHODS)
+        exempt = isinstance(method, CHAT_EXEMPT_METHODS)
+        for attempt in range(1, MAX_RETRIES + 1):
+            chat_bucket = self._chat_bucket(chat_id)
+            delay = 0.0 if exempt else chat_bucket.reserve()
+            global_delay = self.global_bucket.reserve()
+            # Платёжные запросы берут токен, но не стоят в общей очереди
+            if not priority:
+                delay = max(delay, global_delay)
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                chat_bucket.penalize(e.retry_after)
+                # 429 значит, что и общий темп был на пределе
+                self.global_bucket.drain()
+                if attempt == MAX_RETRIES:
+                    raise
+                logging.warning(f"Flood control в чате {chat_id}, повтор через {e.retry_after} с")
+                await asyncio.sleep(e.retry_after)
+
+
+class UpdateUser(BaseMiddleware):
+    # Outer-middleware апдейтов: event_from_user уже выставлен встроенным UserContextMiddleware
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        token = update_user.set(user.id if user else None)
+        try:
+            return await handler(event, data)
+        finally:
+            update_user.reset(token)
+
+
+class PaymentPriority(BaseMiddleware):
+    # Помечает обработку платёжных апдейтов, чтобы их запросы шли вне очереди RateLimiter
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        if isinstance(event, Update) and (
+                event.pre_checkout_query
+                or (event.message and event.message.successful_payment)
+                or (event.callback_query and event.callback_query.data == "confirm_payment")):
+            token = high_priority.set(True)
+            try:
+                return await handler(event, data)
+            finally:
+                high_priority.reset(token)
+        return await handler(event, data)
+
+
+# === Навигация: правка сообщения на месте вместо delete + send ===
+async def replace_message(message: Message, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None,
+                          parse_mode: Optional[str] = None) -> Message:
+    # Вместо delete + send редактируем текстовое сообщение на месте; фото и прочее заменяем как раньше
+    if getattr(message, "text", None) is not None:
+        try:
+            edited = await message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+            return edited if isinstance(edited, Message) else message
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                return message
+            logging.info(f"Редактирование не удалось, отправляем заново: {e}")
+    try:
+        await message.delete()
+    except TelegramBadRequest as e:
+        logging.info(f"Не удалось удалить сообщение {message.message_id}: {e}")
+    return await message.bot.send_message(message.chat.id, text, reply_markup=reply_markup, parse_mode=parse_mode)
+
+
+async def replace_with_photo(message: Message, photo: Union[str, InputFile], caption: str,
+                             reply_markup: Optional[InlineKeyboardMarkup] = None,
+                             parse_mode: Optional[str] = None) -> Message:
+    # Карточка товара поверх карточки товара меняется через edit_message_media, текст — только пересылкой
+    if getattr(message, "photo", None):
+        try:
+            edited = await message.edit_media(InputMediaPhoto(media=photo, caption=caption, parse_mode=parse_mode),
+                                              reply_markup=reply_markup)
+            return edited if isinstance(edited, Message) else message
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                return message
+            logging.info(f"Замена фото не удалась, отправляем заново: {e}")
+    try:
+        await message.delete()
+    except TelegramBadRequest as e:
+        logging.info(f"Не удалось удалить сообщение {message.message_id}: {e}")
+    return await message.bot.send_photo(message.chat.id, photo, caption=caption, reply_markup=reply_markup,
+                                        parse_mode=parse_mode)
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Set, Tuple
+
+# === Журнал оплаченных заказов (outbox) ===
+# Заказ сначала попадает в журнал на диске, и только потом фоновые доставщики шлют его админу и в таблицу.
+# Каждая успешная доставка тоже пишется в журнал, поэтому после рестарта повторно уходит только недоставленное.
+ORDERS_FILE = "orders.jsonl"
+RETRY_DELAY = 5.0
+MAX_RETRY_DELAY = 300.0
+
+Sender = Callable[[Dict], Awaitable[None]]
+
+
+class OrderOutbox:
+    def __init__(self, path: str = ORDERS_FILE, shard: int = 0, shards: int = 1):
+        self.path = path
+        # Номера заказов воркера i дают остаток i по модулю числа воркеров, поэтому журналы не пересекаются
+        self.shard = shard
+        self.shards = shards
+        self.senders: Dict[str, Sender] = {}
+        self._orders: Dict[int, Dict] = {}  # заказы, у которых остались недоставленные цели
+        self._pending: Dict[int, Set[str]] = {}
+        self._inflight: Set[Tuple[int, str]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._last_id = 0
+        self._lock = asyncio.Lock()
+
+    def register(self, target: str, sender: Sender):
+        self.senders[target] = sender
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # Оборванная последняя строка после падения посреди записи
+                    continue
+                order_id = event["order_id"]
+                self._last_id = max(self._last_id, order_id)
+                if event["type"] == "order":
+                    self._orders[order_id] = event["order"]
+                    self._pending[order_id] = set(event["targets"])
+                elif event["type"] == "delivered":
+                    self._pending.get(order_id, set()).discard(event["target"])
+        for order_id in [oid for oid, targets in self._pending.items() if not targets]:
+            del self._pending[order_id]
+            del self._orders[order_id]
+        self._compact()
+        logging.info(f"Журнал заказов прочитан, недоставленных заказов: {len(self._pending)}")
+
+    def _compact(self):
+        # Доставленное из журнала выкидываем, чтобы он не рос вечно; checkpoint хранит последний номер заказа
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"type": "checkpoint", "order_id": self._last_id}) + "\n")
+            for order_id, targets in self._pending.items():
+                event = {"type": "order", "order_id": order_id, "targets": sorted(targets),
+                         "order": self._orders[order_id]}
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def next_order_id(self) -> int:
+        # Миллисекунды с монотонной добавкой: два заказа в одну секунду (и даже миллисекунду) не совпадут,
+        # в том числе у разных воркеров
+        ms = max(int(time.time() * 1000), self._last_id // self.shards + 1)
+        self._last_id = ms * self.shards + self.shard
+        return self._last_id
+
+    def _append(self, event: Dict):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _write(self, event: Dict):
+        async with self._lock:
+            await asyncio.to_thread(self._append, event)
+
+    async def record(self, order_id: int, order: Dict, targets: Iterable[str]):
+        targets = [t for t in targets if t in self.senders]
+        await self._write({"type": "order", "order_id": order_id, "targets": targets, "order": order})
+        if targets:
+            self._orders[order_id] = order
+            self._pending[order_id] = set(targets)
+            for target in targets:
+                self._dispatch(order_id, target)
+
+    def _dispatch(self, order_id: int, target: str):
+        if (order_id, target) in self._inflight:
+            return
+        self._inflight.add((order_id, target))
+        task = asyncio.create_task(self._deliver(order_id, target))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, order_id: int, target: str):
+        delay = RETRY_DELAY
+        try:
+            while True:
+                try:
+                    await self.senders[target](self._orders[order_id])
+                    break
+                except Exception as e:
+                    logging.warning(f"Заказ #{order_id}: доставка «{target}» не удалась ({e}), "
+                                    f"повтор через {delay:.0f} с")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, MAX_RETRY_DELAY)
+            await self._write({"type": "delivered", "order_id": order_id, "target": target})
+            targets = self._pending.get(order_id, set())
+            targets.discard(target)
+            if not targets:
+                self._pending.pop(order_id, None)
+                self._orders.pop(order_id, None)
+        finally:
+            self._inflight.discard((order_id, target))
+
+    def replay(self) -> int:
+        # Перезапуск доставки всего, что ещё не подтверждено в журнале
+        started = 0
+        for order_id, targets in list(self._pending.items()):
+            for target in targets:
+                if target in self.senders and (order_id, target) not in self._inflight:
+                    self._dispatch(order_id, target)
+                    started += 1
+        return started
+
+    def pending(self) -> Dict[int, Set[str]]:
+        return {order_id: set(targets) for order_id, targets in self._pending.items()}
+
+    async def close(self):
+        # Недоставленное останется в журнале и уйдёт после следующего старта
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
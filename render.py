@@ -0,0 +1,85 @@
+from typing import Dict, Optional, Tuple
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from catalog import PLACEHOLDER_IMAGE, Catalog, CatalogDiff, Product
+
+BACK_TO_MENU = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_menu")]
+])
+
+
+class ItemCard:
+    # Готовая карточка товара: подпись, клавиатура и исходный адрес картинки (миниатюра — в media.ImageStore)
+    __slots__ = ("caption", "keyboard", "image_url", "single_weight", "quantity_keyboard")
+
+    def __init__(self, item: Product):
+        back = InlineKeyboardButton(text="🔙 Назад", callback_data=f"cat_{item.category}")
+        self.single_weight = len(item.weights) == 1
+        if self.single_weight:
+            self.caption = f"🍞 *{item.name}*\n\n📋 {item.composition}\n\nВведите количество (целое число):"
+            self.keyboard = InlineKeyboardMarkup(inline_keyboard=[[back]])
+        else:
+            self.caption = f"🍞 *{item.name}*\n\n📋 {item.composition}"
+            self.keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                *([InlineKeyboardButton(text=w, callback_data=f"add_{item.id}_{w}")] for w in item.weights),
+                [back]
+            ])
+        # Клавиатура шага «введите количество» после выбора веса
+        self.quantity_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔙 Назад", callback_data=f"item_{item.id}")]
+        ])
+
+        # Расширение не важно: webp и прочее пережимается в JPEG при синхронизации миниатюр
+        has_image = item.image_url.startswith("http") and item.image_url != PLACEHOLDER_IMAGE
+        self.image_url: Optional[str] = item.image_url if has_image else None
+
+
+def category_view(category: str, catalog: Catalog) -> Tuple[str, InlineKeyboardMarkup]:
+    keyboard = []
+    for item in catalog.items(category):
+        price = item.price(item.weights[0]) / 100
+        keyboard.append(
+            [InlineKeyboardButton(text=f"{item.name} — 💰 {price:.0f}₽", callback_data=f"item_{item.id}")]
+        )
+    keyboard.append([InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_menu")])
+    return f"📦 *{category}*", InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+class RenderCache:
+    # Кэш разметки привязан к версии каталога и пересобирается целиком при его замене
+    def __init__(self):
+        self.version = None
+        self.categories: Dict[str, Tuple[str, InlineKeyboardMarkup]] = {}
+        self.items: Dict[int, ItemCard] = {}
+
+    def build(self, catalog: Catalog):
+        self.categories = {cat: category_view(cat, catalog) for cat, products in catalog.categories.items() if products}
+        self.items = {pid: ItemCard(item) for pid, item in catalog.products.items()}
+        self.version = catalog.version
+
+    def apply(self, diff: CatalogDiff, catalog: Catalog):
+        # Пересобираем только то, что затронуто изменениями; остальные карточки переезжают как есть
+        if self.version != diff.old_version:
+            self.build(catalog)
+            return
+        for pid in diff.removed:
+            self.items.pop(pid, None)
+        for pid in diff.added + diff.changed:
+            self.items[pid] = ItemCard(catalog.products[pid])
+        for cat in diff.categories:
+            if catalog.items(cat):
+                self.categories[cat] = category_view(cat, catalog)
+            else:
+                self.categories.pop(cat, None)
+        self.version = catalog.version
+
+    def _sync(self, catalog: Catalog):
+        if self.version != catalog.version:
+            self.build(catalog)
+
+    def category(self, category: str, catalog: Catalog) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+        self._sync(catalog)
+        return self.categories.get(category)
+
+    def item(self, product_id: int, catalog: Catalog) -> Optional[ItemCard]:
+        self._sync(catalog)
+        return self.items.get(product_id)
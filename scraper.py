@@ -0,0 +1,303 @@
+import os
+import re
+import sys
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from catalog import CATEGORIES, PLACEHOLDER_IMAGE, is_excluded, stable_product_id
+
+load_dotenv()
+
+# === Настройки парсера ===
+SITE_URL = os.getenv("SITE_URL", "https://gorodskoybaton.ru/")
+CATALOG_BACKEND = os.getenv("CATALOG_BACKEND", "selenium")  # selenium | http (Selenium остаётся запасным)
+SCRAPER_MODE = os.getenv("SCRAPER_MODE", "sequential")  # sequential | parallel
+SCRAPER_WORKERS = int(os.getenv("SCRAPER_WORKERS", "3"))
+SCRAPE_INTERVAL = int(os.getenv("SCRAPE_INTERVAL", "3300"))  # период для режима --loop, сек
+SCRAPE_RETRY = 60
+PAGE_TIMEOUT = 20
+TAB_TIMEOUT = 10
+PRICE_TIMEOUT = 2
+PRICE_SETTLE = 0.4  # без data-price не узнать, сменится ли цена: ждём не дольше прежней фиксированной паузы
+
+# Время парсинга каждой категории за последний прогон, сек
+SCRAPE_TIMINGS: Dict[str, float] = {}
+
+
+# Selenium импортируется только внутри функций Selenium-парсера: с CATALOG_BACKEND=http он не грузится вовсе
+def make_driver():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--window-size=1920,1080")
+    return webdriver.Chrome(options=chrome_options)
+
+
+def parse_price(price_text: str) -> int:
+    return int(re.search(r"\d+", price_text.replace(" ", "")).group()) * 100
+
+
+def christmas_cake() -> Dict:
+    return {
+        "name": "Рождественский кекс",
+        "weights": ["С орехами 🥜", "Без орехов 🚫"],
+        "prices": {
+            "С орехами 🥜": 549000,
+            "Без орехов 🚫": 549000
+        },
+        "composition": (
+            "Традиционный рождественский кекс, пропитанный ромом и коньяком.\nВес ~800–850 г.\nСостав: пшеничная мука, сливочное масло, сахар, яйца, ваниль, изюм, "
+            "сушёная вишня, финики, инжир, курага, цитрусовые цукаты, специи."
+        ),
+        "image_url": "https://optim.tildacdn.com/tild3464-3338-4236-a339-646462623538/-/format/webp/Keks_3D_.jpg.webp"
+    }
+
+
+def open_site(driver):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    driver.get(SITE_URL)
+    WebDriverWait(driver, PAGE_TIMEOUT).until(EC.presence_of_element_located((By.CSS_SELECTOR, ".js-product")))
+
+
+def open_tab(driver, tab_text: str):
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    old = driver.find_elements(By.CSS_SELECTOR, ".js-product")
+    button = driver.find_element(By.XPATH, f"//button[contains(text(), '{tab_text}')]")
+    was_active = "active" in (button.get_attribute("class") or "")
+    driver.execute_script("arguments[0].click();", button)
+    # Ждём перерисовки карточек вместо фиксированной паузы; уже активная вкладка не перерисовывается
+    if old and not was_active:
+        try:
+            WebDriverWait(driver, TAB_TIMEOUT).until(EC.staleness_of(old[0]))
+        except TimeoutException:
+            pass
+    WebDriverWait(driver, TAB_TIMEOUT).until(EC.presence_of_element_located((By.CSS_SELECTOR, ".js-product")))
+
+
+def read_weight_price(driver, prod, inp) -> int:
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    price_el = prod.find_element(By.CSS_SELECTOR, ".js-product-price")
+    if inp.is_selected():
+        return parse_price(price_el.text)
+
+    before = price_el.text
+    expected = inp.get_attribute("data-price")
+    label = inp.find_element(By.XPATH, "./following-sibling::div")
+    driver.execute_script("arguments[0].click();", label)
+    try:
+        if expected:
+            # Ждём, пока скрипт Tilda покажет цену этого варианта: условие срабатывает и когда цена та же
+            target = parse_price(expected)
+            WebDriverWait(driver, PRICE_TIMEOUT).until(
+                lambda d: inp.is_selected() and shows_price(price_el, target))
+        else:
+            WebDriverWait(driver, PRICE_TIMEOUT).until(lambda d: inp.is_selected())
+            WebDriverWait(driver, PRICE_SETTLE).until(lambda d: price_el.text != before)
+    except TimeoutException:
+        pass
+    return parse_price(price_el.text)
+
+
+def shows_price(price_el, price: int) -> bool:
+    try:
+        return parse_price(price_el.text) == price
+    except AttributeError:
+        return False  # цена ещё не отрисована
+
+
+def parse_product(driver, prod) -> Optional[Dict]:
+    from selenium.webdriver.common.by import By
+
+    name = prod.find_element(By.CSS_SELECTOR, ".js-product-name").text.strip()
+    if is_excluded(name):
+        return None
+
+    description = ""
+    try:
+        description = prod.find_element(By.CSS_SELECTOR, ".js-store-prod-descr").text.strip()
+    except:
+        pass
+
+    weights = []
+    prices = {}
+    try:
+        inputs = prod.find_elements(By.CSS_SELECTOR, "input[name='Вес']")
+        for inp in inputs:
+            val = inp.get_attribute("value")
+            if val and val.isdigit():
+                weight = f"{val}г"
+                weights.append(weight)
+                prices[weight] = read_weight_price(driver, prod, inp)
+    except:
+        pass
+
+    if not weights:
+        weights = ["350г"]
+        price_text = prod.find_element(By.CSS_SELECTOR, ".js-product-price").text
+        prices["350г"] = parse_price(price_text)
+
+    image_url = PLACEHOLDER_IMAGE
+    try:
+        img = prod.find_element(By.CSS_SELECTOR, "img.js-product-img")
+        src = img.get_attribute("data-original") or img.get_attribute("src")
+        if src.startswith("//"):
+            src = "https:" + src
+        image_url = src
+    except:
+        pass
+
+    return {
+        "name": name,
+        "weights": weights,
+        "prices": prices,
+        "composition": description or "Состав не указан",
+        "image_url": image_url
+    }
+
+
+def scrape_category(driver, category: str) -> List[Dict]:
+    from selenium.webdriver.common.by import By
+
+    started = time.perf_counter()
+    items = []
+    try:
+        open_tab(driver, CATEGORIES[category])
+        for prod in driver.find_elements(By.CSS_SELECTOR, ".js-product"):
+            try:
+                item = parse_product(driver, prod)
+            except:
+                continue
+            if item:
+                items.append(item)
+
+        # Добавляем рождественский кекс
+        items.append(christmas_cake())
+    except Exception as e:
+        logging.warning(f"Ошибка категории {category}: {e}")
+        items = []
+    SCRAPE_TIMINGS[category] = time.perf_counter() - started
+    logging.info(f"Категория {category}: {len(items)} товаров за {SCRAPE_TIMINGS[category]:.1f} с")
+    return items
+
+
+def scrape_category_standalone(category: str) -> List[Dict]:
+    # Отдельный браузер на категорию для параллельного режима
+    driver = make_driver()
+    try:
+        open_site(driver)
+        return scrape_category(driver, category)
+    except Exception as e:
+        logging.warning(f"Ошибка категории {category}: {e}")
+        return []
+    finally:
+        driver.quit()
+
+
+def assign_ids(raw: Dict[str, List[Dict]]) -> Dict:
+    catalog = {}
+    taken = set()
+    for category in CATEGORIES:
+        items = []
+        for item in raw.get(category, []):
+            product_id = stable_product_id(category, item["name"], taken)
+            taken.add(product_id)
+            items.append({"id": product_id, **item})
+        catalog[category] = items
+    return {k: v for k, v in catalog.items() if v}
+
+
+def parse_catalog_sequential() -> Dict:
+    driver = make_driver()
+    try:
+        open_site(driver)
+        return assign_ids({category: scrape_category(driver, category) for category in CATEGORIES})
+    except Exception as e:
+        logging.error(f"Парсинг не удался: {e}")
+        return {}
+    finally:
+        driver.quit()
+
+
+def parse_catalog_parallel(workers: int = SCRAPER_WORKERS) -> Dict:
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(CATEGORIES)))) as pool:
+        results = dict(zip(CATEGORIES, pool.map(scrape_category_standalone, CATEGORIES)))
+    return assign_ids(results)
+
+
+def parse_catalog_via_http() -> Dict:
+    from store_api import parse_catalog_http
+
+    raw = parse_catalog_http()
+    # Кекс добавляется в каждую найденную вкладку, как и в Selenium-парсере
+    return assign_ids({category: items + [christmas_cake()] for category, items in raw.items()})
+
+
+def parse_catalog() -> Dict:
+    SCRAPE_TIMINGS.clear()
+    started = time.perf_counter()
+    if CATALOG_BACKEND == "http":
+        try:
+            catalog = parse_catalog_via_http()
+        except Exception as e:
+            logging.warning(f"HTTP-парсер не сработал, переключаемся на Selenium: {e}")
+            catalog = {}
+        if catalog:
+            logging.info(f"Парсинг (http) завершён за {time.perf_counter() - started:.1f} с")
+            return catalog
+
+    if SCRAPER_MODE == "parallel":
+        catalog = parse_catalog_parallel()
+    else:
+        catalog = parse_catalog_sequential()
+    logging.info(f"Парсинг ({SCRAPER_MODE}) завершён за {time.perf_counter() - started:.1f} с")
+    return catalog
+
+
+# === Отдельный процесс парсера ===
+# python scraper.py         — один прогон и публикация снимка
+# python scraper.py --loop  — парсить по расписанию; бот с CATALOG_SOURCE=worker подхватит снимки сам
+def publish() -> bool:
+    from catalog import Catalog
+    from snapshot import save_catalog
+
+    started = time.time()
+    data = parse_catalog()
+    if not data:
+        logging.warning("Парсинг вернул пустой каталог, снимок не публикуем")
+        return False
+    path = save_catalog(Catalog(data, started))
+    logging.info(f"Опубликован снимок каталога {path}")
+    return True
+
+
+def main(argv: List[str]) -> int:
+    logging.basicConfig(level=logging.INFO)
+    if "--loop" not in argv:
+        return 0 if publish() else 1
+    while True:
+        try:
+            ok = publish()
+        except Exception as e:
+            logging.error(f"Парсинг не удался: {e}")
+            ok = False
+        time.sleep(SCRAPE_INTERVAL if ok else SCRAPE_RETRY)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,150 @@
+import re
+import bisect
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from aiogram.types import (InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle,
+                           InputTextMessageContent)
+from catalog import PLACEHOLDER_IMAGE, Catalog, Product
+
+# === Поиск товаров для inline-режима ===
+# Индекс строится из названий и составов при каждой смене каталога; запрос разбирается на токены,
+# каждый токен ищется по префиксу в отсортированном словаре, а если не нашёлся — с одной опечаткой.
+PAGE_SIZE = 20  # Telegram принимает до 50 результатов за ответ
+MAX_CACHED_QUERIES = 1000
+NAME_WEIGHT = 3
+COMPOSITION_WEIGHT = 1
+TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+# Грубое отсечение окончаний, чтобы «ржаная» находила «ржаной», а «семечки» — «в семечках»
+ENDINGS = sorted(("ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ая", "яя", "ой", "ый", "ий", "ое", "ее",
+                  "ые", "ие", "ых", "их", "ую", "юю", "ах", "ях", "ам", "ям", "ом", "ем", "ов", "ев",
+                  "а", "я", "о", "е", "ы", "и", "у", "ю", "ь"), key=len, reverse=True)
+MIN_STEM = 3
+
+
+def stem(token: str) -> str:
+    for ending in ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= MIN_STEM:
+            return token[:-len(ending)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(token) for token in TOKEN_RE.findall(text.lower().replace("ё", "е"))]
+
+
+def _one_typo(a: str, b: str) -> bool:
+    # Расстояние Левенштейна не больше 1: замена, вставка или удаление одной буквы
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = j = edits = 0
+    while i < len(a) and j < len(b):
+        if a[i] != b[j]:
+            edits += 1
+            if edits > 1:
+                return False
+            if len(a) == len(b):
+                i += 1
+            j += 1
+            continue
+        i += 1
+        j += 1
+    return edits + (len(b) - j) <= 1
+
+
+class SearchIndex:
+    def __init__(self):
+        self.version = None
+        self.postings: Dict[str, Dict[int, int]] = {}  # токен -> {product_id: вес}
+        self.vocabulary: List[str] = []
+        self.order: Dict[int, int] = {}  # порядок товаров в каталоге для стабильной сортировки
+        self._rankings: "OrderedDict[str, Tuple[int, ...]]" = OrderedDict()
+        self._results: Dict[int, InlineQueryResultArticle] = {}
+
+    def build(self, catalog: Catalog):
+        postings: Dict[str, Dict[int, int]] = {}
+        self.order = {}
+        for position, product in enumerate(catalog.products.values()):
+            self.order[product.id] = position
+            for weight, text in ((NAME_WEIGHT, product.name), (COMPOSITION_WEIGHT, product.composition)):
+                for token in set(tokenize(text)):
+                    scores = postings.setdefault(token, {})
+                    scores[product.id] = max(scores.get(product.id, 0), weight)
+        self.postings = postings
+        self.vocabulary = sorted(postings)
+        self._rankings.clear()
+        self._results.clear()
+        self.version = catalog.version
+
+    def _matches(self, token: str) -> Dict[int, int]:
+        start = bisect.bisect_left(self.vocabulary, token)
+        candidates = []
+        for word in self.vocabulary[start:]:
+            if not word.startswith(token):
+                break
+            candidates.append(word)
+        if not candidates and len(token) >= 4:
+            candidates = [word for word in self.vocabulary if word[0] == token[0] and _one_typo(token, word)]
+        scores: Dict[int, int] = {}
+        for word in candidates:
+            for product_id, weight in self.postings[word].items():
+                scores[product_id] = max(scores.get(product_id, 0), weight)
+        return scores
+
+    def rank(self, query: str) -> Tuple[int, ...]:
+        tokens = tokenize(query)
+        key = " ".join(tokens)
+        cached = self._rankings.get(key)
+        if cached is not None:
+            self._rankings.move_to_end(key)
+            return cached
+        if tokens:
+            # Все слова запроса должны найтись; очки складываются, название весит больше состава
+            total: Optional[Dict[int, int]] = None
+            for token in tokens:
+                scores = self._matches(token)
+                if total is None:
+                    total = scores
+                else:
+                    total = {pid: total[pid] + score for pid, score in scores.items() if pid in total}
+                if not total:
+                    break
+            ranking = tuple(sorted(total or {}, key=lambda pid: (-total[pid], self.order[pid])))
+        else:
+            ranking = tuple(self.order)
+        self._rankings[key] = ranking
+        if len(self._rankings) > MAX_CACHED_QUERIES:
+            self._rankings.popitem(last=False)
+        return ranking
+
+    def result(self, product: Product, bot_username: str) -> InlineQueryResultArticle:
+        cached = self._results.get(product.id)
+        if cached is None:
+            # То же правило, что у карточки товара: только http-картинки и без заглушки
+            image_url = product.image_url
+            if not image_url.startswith("http") or image_url == PLACEHOLDER_IMAGE:
+                image_url = None
+            prices = ", ".join(f"{w} — {product.price(w) / 100:.0f}₽" for w in product.weights)
+            cached = self._results[product.id] = InlineQueryResultArticle(
+                id=str(product.id),
+                title=product.name,
+                description=f"{product.category} · {prices}",
+                thumbnail_url=image_url,
+                input_message_content=InputTextMessageContent(
+                    message_text=f"🍞 *{product.name}*\n💰 {prices}\n\n📋 {product.composition}",
+                    parse_mode="Markdown"),
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+                    text="🛒 Заказать в боте", url=f"https://t.me/{bot_username}?start=item_{product.id}")]])
+            )
+        return cached
+
+    def page(self, query: str, offset: str, catalog: Catalog,
+             bot_username: str) -> Tuple[List[InlineQueryResultArticle], str]:
+        if self.version != catalog.version:
+            self.build(catalog)
+        ranking = self.rank(query)
+        start = int(offset) if offset.isdigit() else 0
+        end = start + PAGE_SIZE
+        results = [self.result(catalog.products[pid], bot_username) for pid in ranking[start:end]]
+        return results, str(end) if end < len(ranking) else ""
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Set
+
+# === Google Sheets: пакетная запись заказов ===
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+SERVICE_ACCOUNT_FILE = 'credentials.json'
+BATCH_SIZE = 20
+FLUSH_INTERVAL = 2.0  # сколько ждать добора пачки после первой строки, сек
+MAX_RETRIES = 5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _cell_key(value) -> str:
+    # UNFORMATTED_VALUE отдаёт числа как float: 5376620125815.0 и 5376620125815 — один заказ
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+class SheetsWriter:
+    # Клиент строится один раз; строки копятся в очереди и уходят одним values().append на пачку.
+    # Первая ячейка строки — ключ (номер заказа): доставка из журнала at-least-once, и строка, уже попавшая
+    # в таблицу до падения, повторно не добавляется.
+    def __init__(self, sheet_id: str, credentials_file: str = SERVICE_ACCOUNT_FILE,
+                 endpoint: Optional[str] = None, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.sheet_id = sheet_id
+        self.credentials_file = credentials_file
+        self.endpoint = endpoint  # адрес фейкового Sheets API для тестов
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._service = None
+        # httplib2 внутри клиента не потокобезопасен, поэтому все вызовы идут через один поток
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheets")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._keys: Optional[Set[str]] = None  # ключи строк, уже лежащих в таблице; читаются при первой записи
+
+    def _build(self):
+        if self._service is None:
+            # Клиент Google тяжёлый, грузим его при первой записи, а не на старте бота
+            from googleapiclient.discovery import build
+            from google.oauth2.service_account import Credentials
+            from google.auth.credentials import AnonymousCredentials
+
+            if self.endpoint:
+                creds = AnonymousCredentials()
+                options = {"api_endpoint": self.endpoint}
+            else:
+                creds = Credentials.from_service_account_file(self.credentials_file, scopes=SCOPES)
+                options = None
+            self._service = build('sheets', 'v4', credentials=creds, client_options=options,
+                                  cache_discovery=False)
+        return self._service
+
+    def _read_keys(self) -> Set[str]:
+        result = self._build().spreadsheets().values().get(
+            spreadsheetId=self.sheet_id,
+            range="A:A",
+            valueRenderOption="UNFORMATTED_VALUE"
+        ).execute()
+        return {_cell_key(row[0]) for row in result.get("values", []) if row}
+
+    def _append(self, rows: List[list]) -> int:
+        if self._keys is None:
+            self._keys = self._read_keys()
+        fresh, keys = [], set()
+        for row in rows:
+            key = _cell_key(row[0])
+            if key not in self._keys and key not in keys:
+                fresh.append(row)
+                keys.add(key)
+        rows = fresh
+        if not rows:
+            return 0
+        try:
+            self._build().spreadsheets().values().append(
+                spreadsheetId=self.sheet_id,
+                range="A1",
+                valueInputOption="RAW",
+                body={"values": rows}
+            ).execute()
+        except Exception:
+            # Запись могла дойти до таблицы, а потерялся только ответ: перед повтором перечитываем колонку A
+            self._keys = None
+            raise
+        self._keys |= keys
+        return len(rows)
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    def append(self, row: list) -> asyncio.Future:
+        # Возвращает future, который завершится, когда строка реально окажется в таблице
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        # Ошибка уже залогирована воркером, не шумим «exception was never retrieved», если future не ждут
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._queue.put_nowait((row, future))
+        return future
+
+    async def _collect(self) -> list:
+        # None в очереди — сигнал остановки от close()
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch: list):
+        from googleapiclient.errors import HttpError
+
+        rows = [row for row, _ in batch]
+        loop = asyncio.get_running_loop()
+        delay = 1.0
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                written = await loop.run_in_executor(self._executor, self._append, rows)
+                break
+            except HttpError as e:
+                if e.resp.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    raise
+                logging.warning(f"Sheets ответил {e.resp.status}, повтор через {delay:.0f} с")
+            except OSError as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                logging.warning(f"Сетевая ошибка Sheets: {e}, повтор через {delay:.0f} с")
+            await asyncio.sleep(delay)
+            delay *= 2
+        logging.info(f"В Google Sheets записано строк: {written}, уже были в таблице: {len(rows) - written}")
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            stop = batch[-1] is None
+            batch = [entry for entry in batch if entry is not None]
+            if not batch and stop:
+                return
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                logging.error(f"Ошибка записи: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(True)
+            if stop:
+                return
+
+    async def close(self):
+        # Дописываем всё, что осталось в очереди, и останавливаем воркер
+        if self._worker is None:
+            return
+        self._queue.put_nowait(None)
+        await self._worker
+        self._worker = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import logging
+from typing import List, Optional
+from dotenv import load_dotenv
+from catalog import Catalog
+
+load_dotenv()
+
+# === Снимки каталога на диске ===
+# catalog.json остаётся основным файлом (старые поля catalog/timestamp на месте), но пишется атомарно
+# и с контрольной суммой; рядом хранятся последние снимки на случай, если основной файл повреждён.
+# Пути можно вынести на общий том, чтобы снимки публиковал отдельный процесс парсера
+CACHE_FILE = os.getenv("CATALOG_FILE", "catalog.json")
+COMPACT_FILE = os.getenv("CATALOG_COMPACT_FILE", "catalog.bin")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_FORMAT = os.getenv("SNAPSHOT_FORMAT", "json")  # json | compact
+KEEP_SNAPSHOTS = 5
+SCHEMA_VERSION = 2
+COMPACT_MAGIC = b"GBC3"  # GBC2 — прежний формат на pickle, такие снимки больше не читаются
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _checksum(payload: bytes) -> str:
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _canonical(catalog: Catalog) -> bytes:
+    return json.dumps(catalog.to_dict(), ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _write_atomic(path: str, payload: bytes):
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def encode_json(catalog: Catalog) -> bytes:
+    return json.dumps({
+        "schema": SCHEMA_VERSION,
+        "timestamp": catalog.timestamp or time.time(),
+        "checksum": _checksum(_canonical(catalog)),
+        "catalog": catalog.to_dict()
+    }, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def decode_json(raw: bytes) -> Catalog:
+    data = json.loads(raw)
+    catalog = Catalog(data["catalog"], data.get("timestamp", 0))
+    schema = data.get("schema", 1)
+    if schema > SCHEMA_VERSION:
+        raise SnapshotError(f"неизвестная версия схемы {schema}")
+    # У файлов первой версии контрольной суммы нет
+    if schema >= 2 and data.get("checksum") != _checksum(_canonical(catalog)):
+        raise SnapshotError("контрольная сумма не совпадает")
+    return catalog
+
+
+def encode_compact(catalog: Catalog) -> bytes:
+    # Строки каталога в сжатом JSON: снимок может лежать на общем томе, поэтому никакого pickle —
+    # чужой файл в худшем случае не разберётся, но и код при чтении не выполнит
+    rows = json.dumps([SCHEMA_VERSION, catalog.timestamp or time.time(), catalog.to_rows()],
+                      ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    body = zlib.compress(rows)
+    return COMPACT_MAGIC + hashlib.sha256(body).digest() + body
+
+
+def decode_compact(raw: bytes) -> Catalog:
+    # Контрольная сумма ловит битые файлы, проверяется до распаковки
+    if raw[:4] != COMPACT_MAGIC:
+        raise SnapshotError("не компактный снимок")
+    digest, body = raw[4:36], raw[36:]
+    if hashlib.sha256(body).digest() != digest:
+        raise SnapshotError("контрольная сумма не совпадает")
+    schema, timestamp, rows = json.loads(zlib.decompress(body))
+    if schema != SCHEMA_VERSION:
+        raise SnapshotError(f"неизвестная версия схемы {schema}")
+    return Catalog.from_rows(rows, timestamp)
+
+
+def _decode(path: str) -> Catalog:
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return decode_compact(raw) if raw[:4] == COMPACT_MAGIC else decode_json(raw)
+
+
+def history() -> List[str]:
+    # Снимки от новых к старым
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    names = sorted((n for n in os.listdir(SNAPSHOT_DIR) if n.startswith("catalog-")), reverse=True)
+    return [os.path.join(SNAPSHOT_DIR, n) for n in names]
+
+
+def save_catalog(catalog: Catalog) -> str:
+    compact = SNAPSHOT_FORMAT == "compact"
+    payload = encode_compact(catalog) if compact else encode_json(catalog)
+    # Совместимый catalog.json пишем всегда: его читают старые версии бота
+    _write_atomic(CACHE_FILE, payload if not compact else encode_json(catalog))
+    if compact:
+        _write_atomic(COMPACT_FILE, payload)
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    snapshot = os.path.join(SNAPSHOT_DIR, f"catalog-{int((catalog.timestamp or time.time()) * 1000)}"
+                                          f".{'bin' if compact else 'json'}")
+    _write_atomic(snapshot, payload)
+    for old in history()[KEEP_SNAPSHOTS:]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return snapshot
+
+
+def snapshot_mtime() -> float:
+    # Основные файлы всегда заменяются через os.replace, так что новое mtime означает готовый снимок
+    mtimes = [os.path.getmtime(p) for p in (CACHE_FILE, COMPACT_FILE) if os.path.exists(p)]
+    return max(mtimes, default=0.0)
+
+
+def load_catalog() -> Optional[Catalog]:
+    # Берём первый целый снимок: основной файл, затем история от новых к старым
+    candidates = ([COMPACT_FILE] if SNAPSHOT_FORMAT == "compact" else []) + [CACHE_FILE] + history()
+    for path in candidates:
+        if not os.path.exists(path):
+            continue
+        try:
+            catalog = _decode(path)
+        except Exception as e:
+            logging.warning(f"Снимок каталога {path} повреждён: {e}")
+            continue
+        if catalog:
+            if path not in (CACHE_FILE, COMPACT_FILE):
+                logging.warning(f"Каталог восстановлен из резервного снимка {path}")
+            return catalog
+    return None
@@ -0,0 +1,88 @@
+import sys
+import time
+import logging
+import importlib.abc
+from typing import Dict
+
+# === Отчёт о холодном старте ===
+# Импортируется первым в bot.py: засекает время импорта каждого пакета верхнего уровня
+# (включая всё, что он тянет за собой) и время до первого getUpdates/setWebhook.
+PROCESS_STARTED = time.perf_counter()
+IMPORT_TIMES: Dict[str, float] = {}
+STAGES: Dict[str, float] = {}
+REPORT_TOP = 10
+
+
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader, name: str):
+        self._loader = loader
+        self._name = name
+
+    def __getattr__(self, item):
+        return getattr(self._loader, item)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            IMPORT_TIMES[self._name] = time.perf_counter() - started
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        if "." in fullname or fullname in IMPORT_TIMES:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, fullname)
+                return spec
+        return None
+
+
+_timer = _ImportTimer()
+sys.meta_path.insert(0, _timer)
+
+# aiogram импортируем только после установки таймера, чтобы он тоже попал в отчёт
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType  # noqa: E402
+from aiogram.methods import GetUpdates, SetWebhook, TelegramMethod  # noqa: E402
+from aiogram.methods.base import TelegramType  # noqa: E402
+
+
+def stage(name: str):
+    STAGES[name] = time.perf_counter() - PROCESS_STARTED
+    if _timer in sys.meta_path and name == "imports":
+        # Дальше импорты происходят лениво во время работы, их в отчёт не берём
+        sys.meta_path.remove(_timer)
+
+
+def report() -> str:
+    slowest = sorted(IMPORT_TIMES.items(), key=lambda kv: kv[1], reverse=True)[:REPORT_TOP]
+    lines = ["Отчёт о старте:"]
+    lines += [f"  {name}: {seconds * 1000:.0f} мс" for name, seconds in STAGES.items()]
+    lines.append("  самые долгие импорты (вместе с зависимостями):")
+    lines += [f"    {name}: {seconds * 1000:.0f} мс" for name, seconds in slowest]
+    return "\n".join(lines)
+
+
+class FirstRequestTimer(BaseRequestMiddleware):
+    # Фиксирует момент, когда бот впервые готов получать апдейты, и печатает отчёт
+    def __init__(self):
+        self.done = False
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> TelegramType:
+        if self.done or not isinstance(method, (GetUpdates, SetWebhook)):
+            return await make_request(bot, method)
+        self.done = True
+        stage(f"первый {type(method).__name__}")
+        logging.info(report())
+        return await make_request(bot, method)
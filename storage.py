@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Mapping, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# === Хранилище FSM ===
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")  # sqlite | redis | memory
+FSM_DB_FILE = os.getenv("FSM_DB_FILE", "fsm.sqlite3")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+FSM_TTL = int(os.getenv("FSM_TTL", str(7 * 24 * 3600)))  # корзины без активности дольше недели удаляются
+FLUSH_INTERVAL = 1.0
+SWEEP_INTERVAL = 3600.0  # как часто удалять просроченные записи; на каждом сбросе это лишняя запись на диск
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+class SQLiteStorage(BaseStorage):
+    # Записи живут в памяти и пачками сбрасываются в SQLite раз в FLUSH_INTERVAL секунд
+    def __init__(self, path: str = FSM_DB_FILE, ttl: int = FSM_TTL, flush_interval: float = FLUSH_INTERVAL,
+                 sweep_interval: float = SWEEP_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True,
+                                             with_destiny=True)
+        self._records: Dict[str, list] = {}  # key -> [state, data, updated_at]
+        self._dirty = set()
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fsm (key TEXT PRIMARY KEY, state TEXT, data TEXT, updated_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS fsm_updated_at ON fsm (updated_at)")
+        self._db.commit()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def _read(self, key: str) -> Optional[list]:
+        with self._db_lock:
+            row = self._db.execute("SELECT state, data, updated_at FROM fsm WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        return [row[0], json.loads(row[1]) if row[1] else {}, row[2]]
+
+    async def _record(self, key: StorageKey) -> list:
+        name = self.key_builder.build(key)
+        record = self._records.get(name)
+        if record is None:
+            record = await asyncio.to_thread(self._read, name)
+            if record is None or time.time() - record[2] > self.ttl:
+                record = [None, {}, time.time()]
+            # Пока ждали SQLite, запись могли создать параллельно
+            record = self._records.setdefault(name, record)
+        return record
+
+    def _touch(self, key: StorageKey, record: list):
+        record[2] = time.time()
+        self._dirty.add(self.key_builder.build(key))
+        if self._flusher is None and not self._closed:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record[0] = _state_name(state)
+        self._touch(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        record = await self._record(key)
+        record[1] = dict(data)
+        self._touch(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict((await self._record(key))[1])
+
+    def _write(self, rows: list, expired_before: Optional[float]):
+        with self._db_lock:
+            if rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?)", rows
+                )
+            if expired_before is not None:
+                self._db.execute("DELETE FROM fsm WHERE updated_at < ?", (expired_before,))
+            self._db.commit()
+
+    async def flush(self):
+        now = time.time()
+        # Чистка по TTL — раз в sweep_interval, а не на каждом сбросе
+        expired_before = None
+        if now - self._last_sweep >= self.sweep_interval:
+            expired_before = now - self.ttl
+        if not self._dirty and expired_before is None:
+            return
+        names, self._dirty = self._dirty, set()
+        rows = []
+        for name in names:
+            record = self._records.get(name)
+            if record:
+                rows.append((name, record[0], json.dumps(record[1], ensure_ascii=False), record[2]))
+        if expired_before is not None:
+            # Из памяти вытесняем всё, что простаивало дольше TTL
+            for name in [n for n, r in self._records.items() if r[2] < expired_before]:
+                del self._records[name]
+        try:
+            await asyncio.to_thread(self._write, rows, expired_before)
+        except Exception:
+            self._dirty |= names
+            raise
+        if expired_before is not None:
+            self._last_sweep = now
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Не удалось сохранить FSM в SQLite: {e}")
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._flusher:
+            self._flusher.cancel()
+        await self.flush()
+        with self._db_lock:
+            self._db.close()
+
+
+def create_storage() -> BaseStorage:
+    if FSM_STORAGE == "redis":
+        # Любой Redis-совместимый сервер (Redis, KeyDB, Valkey, локальная заглушка) с TTL на каждую запись
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(
+            REDIS_URL,
+            key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+            state_ttl=FSM_TTL,
+            data_ttl=FSM_TTL,
+        )
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return SQLiteStorage()
@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import time
+import logging
+import asyncio
+from html import unescape
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+import aiohttp
+from dotenv import load_dotenv
+from catalog import CATEGORIES, PLACEHOLDER_IMAGE, is_excluded
+
+load_dotenv()
+
+# === Каталог через HTTP API магазина Tilda (без браузера) ===
+SITE_URL = os.getenv("SITE_URL", "https://gorodskoybaton.ru/")
+STORE_API_URL = os.getenv("STORE_API_URL", "https://store.tildaapi.com/api/getproductslist/")
+HTTP_TIMEOUT = 20
+PAGE_SIZE = 500
+
+RECID_RE = re.compile(r"t_store_init\(\s*['\"]?(\d+)")
+STOREPART_RE = re.compile(r"['\"]?storepart(?:uid)?['\"]?\s*[:=]\s*['\"](\d+)['\"]")
+
+
+class _TextExtractor(HTMLParser):
+    # Превращает HTML-описание Tilda в текст так же, как .text у Selenium
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("br", "p", "div", "li"):
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    parser = _TextExtractor()
+    parser.feed(html or "")
+    parser.close()
+    text = unescape("".join(parser.parts)).replace("\xa0", " ")
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.split("\n")]
+    return "\n".join(line for line in lines if line)
+
+
+def find_store_blocks(html: str) -> List[Tuple[str, str]]:
+    # Пары (recid, storepart) из скриптов инициализации t-store на странице
+    blocks = []
+    for match in RECID_RE.finditer(html):
+        tail = html[match.end():match.end() + 4000]
+        part = STOREPART_RE.search(tail)
+        if part and (match.group(1), part.group(1)) not in blocks:
+            blocks.append((match.group(1), part.group(1)))
+    return blocks
+
+
+def _json_field(value, default):
+    # Tilda отдаёт часть полей строками с JSON внутри
+    if isinstance(value, str):
+        try:
+            return json.loads(value) if value else default
+        except ValueError:
+            return default
+    return value if value is not None else default
+
+
+def _price(value) -> Optional[int]:
+    try:
+        return int(float(str(value).replace(" ", "").replace(",", "."))) * 100
+    except ValueError:
+        return None
+
+
+def product_from_json(product: Dict) -> Optional[Dict]:
+    name = (product.get("title") or "").strip()
+    if is_excluded(name):
+        return None
+
+    weights = []
+    prices = {}
+    for edition in product.get("editions") or []:
+        val = str(edition.get("Вес", "")).strip()
+        price = _price(edition.get("price"))
+        if val.isdigit() and price is not None and f"{val}г" not in prices:
+            weights.append(f"{val}г")
+            prices[f"{val}г"] = price
+
+    if not weights:
+        price = _price(product.get("price"))
+        if price is None:
+            return None
+        weights = ["350г"]
+        prices["350г"] = price
+
+    image_url = PLACEHOLDER_IMAGE
+    gallery = _json_field(product.get("gallery"), [])
+    if gallery and gallery[0].get("img"):
+        image_url = gallery[0]["img"]
+        if image_url.startswith("//"):
+            image_url = "https:" + image_url
+
+    description = html_to_text(product.get("descr") or "")
+    return {
+        "name": name,
+        "weights": weights,
+        "prices": prices,
+        "composition": description or "Состав не указан",
+        "image_url": image_url
+    }
+
+
+def products_from_response(payload: Dict) -> Dict[str, List[Dict]]:
+    # Раскладывает ответ getproductslist по вкладкам (parts) магазина; в ключах только найденные вкладки
+    part_titles = {str(p.get("uid")): (p.get("title") or "").strip() for p in payload.get("parts") or []}
+    tab_to_category = {tab: category for category, tab in CATEGORIES.items()}
+    raw = {tab_to_category[t]: [] for t in part_titles.values() if t in tab_to_category}
+    for product in payload.get("products") or []:
+        item = product_from_json(product)
+        if not item:
+            continue
+        for part_uid in _json_field(product.get("partuids"), []):
+            category = tab_to_category.get(part_titles.get(str(part_uid), ""))
+            if category:
+                raw[category].append(item)
+    return raw
+
+
+async def fetch_store(session: aiohttp.ClientSession, recid: str, storepart: str) -> Dict:
+    params = {
+        "storepartuid": storepart,
+        "recid": recid,
+        "c": str(int(time.time() * 1000)),
+        "getparts": "true",
+        "getoptions": "true",
+        "slice": "1",
+        "size": str(PAGE_SIZE),
+    }
+    async with session.get(STORE_API_URL, params=params) as resp:
+        resp.raise_for_status()
+        return json.loads(await resp.text())
+
+
+async def fetch_catalog() -> Dict[str, List[Dict]]:
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.get(SITE_URL) as resp:
+            resp.raise_for_status()
+            html = await resp.text()
+
+        blocks = find_store_blocks(html)
+        if not blocks:
+            raise ValueError("На странице не найдены блоки магазина Tilda")
+        payloads = await asyncio.gather(*(fetch_store(session, recid, part) for recid, part in blocks))
+
+    raw = {}
+    for payload in payloads:
+        for category, items in products_from_response(payload).items():
+            raw.setdefault(category, []).extend(items)
+    return raw
+
+
+def parse_catalog_http() -> Dict[str, List[Dict]]:
+    started = time.perf_counter()
+    raw = asyncio.run(fetch_catalog())
+    logging.info(f"Каталог по HTTP получен за {time.perf_counter() - started:.1f} с")
+    return raw
@@ -0,0 +1,164 @@
+import os
+import json
+import hashlib
+import bisect
+import signal
+import asyncio
+import logging
+import multiprocessing
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# === Разбор апдейтов по процессам ===
+# Принимающий процесс (webhook или polling) не обрабатывает апдейты сам, а раскладывает их по N воркерам
+# по user_id через консистентное хеширование. Все апдейты одного пользователя попадают в один процесс
+# и там выполняются строго по очереди, разные пользователи обрабатываются параллельно.
+RING_REPLICAS = 100  # виртуальных точек на воркер, чтобы пользователи делились равномерно
+STOP_TIMEOUT = 15
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    # При смене числа воркеров переезжает только ~1/N пользователей, а не почти все, как при user_id % N
+    def __init__(self, workers: int, replicas: int = RING_REPLICAS):
+        points = sorted(
+            (_hash(f"worker-{worker}-{replica}"), worker)
+            for worker in range(workers) for replica in range(replicas)
+        )
+        self.hashes = [h for h, _ in points]
+        self.workers = [w for _, w in points]
+
+    def lookup(self, key: int) -> int:
+        position = bisect.bisect(self.hashes, _hash(str(key))) % len(self.hashes)
+        return self.workers[position]
+
+
+def update_user_id(update: Dict) -> int:
+    # Автор апдейта: from у сообщений, колбэков, inline и платежей; иначе — чат; служебные апдейты — в воркер 0
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        if isinstance(value.get("from"), dict):
+            return value["from"]["id"]
+        if isinstance(value.get("user"), dict):
+            return value["user"]["id"]
+        if isinstance(value.get("chat"), dict):
+            return value["chat"]["id"]
+    return 0
+
+
+class KeyedSerializer:
+    # Внутри воркера: апдейты одного пользователя выполняются по очереди, остальные — конкурентно
+    def __init__(self):
+        self.tails: Dict[int, asyncio.Task] = {}
+
+    def submit(self, key: int, job: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        previous = self.tails.get(key)
+
+        async def run():
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            try:
+                await job()
+            except Exception as e:
+                logging.error(f"Ошибка обработки апдейта пользователя {key}: {e}")
+            finally:
+                if self.tails.get(key) is task:
+                    del self.tails[key]
+
+        task = asyncio.create_task(run())
+        self.tails[key] = task
+        return task
+
+    async def drain(self, timeout: float):
+        if self.tails:
+            await asyncio.wait(list(self.tails.values()), timeout=timeout)
+
+
+class UpdateRouter:
+    # broadcast(update) — апдейты, которые должен увидеть каждый воркер (например, админские команды
+    # над журналами, которые у каждого воркера свои)
+    def __init__(self, workers: int, broadcast: Optional[Callable[[Dict], bool]] = None):
+        self.ring = HashRing(workers)
+        self.broadcast = broadcast
+        self._ctx = multiprocessing.get_context("spawn")
+        self.queues = [self._ctx.Queue() for _ in range(workers)]
+        self.processes: List[multiprocessing.Process] = []
+
+    def start(self):
+        for index, queue in enumerate(self.queues):
+            process = self._ctx.Process(target=worker_main, args=(index, len(self.queues), queue),
+                                        name=f"bot-worker-{index}", daemon=False)
+            process.start()
+            self.processes.append(process)
+        logging.info(f"Запущено воркеров: {len(self.processes)}")
+
+    def dispatch(self, update: Dict):
+        # В очередь уходит готовая JSON-строка: её быстрее передать между процессами, чем dict
+        raw = json.dumps(update, ensure_ascii=False)
+        if self.broadcast and self.broadcast(update):
+            for queue in self.queues:
+                queue.put(raw)
+            return
+        self.queues[self.ring.lookup(update_user_id(update))].put(raw)
+
+    async def stop(self):
+        for queue in self.queues:
+            queue.put(None)
+        await asyncio.to_thread(self._join)
+
+    def _join(self):
+        for process in self.processes:
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                logging.warning(f"{process.name} не остановился вовремя, завершаем принудительно")
+                process.terminate()
+        for queue in self.queues:
+            queue.close()
+            queue.join_thread()
+
+
+async def poll_updates(bot, allowed_updates: Optional[List[str]], dispatch: Callable[[Dict], None]):
+    # Long polling без Dispatcher: апдейты не обрабатываются здесь, а сразу уходят воркерам
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed_updates)
+        except Exception as e:
+            logging.error(f"getUpdates не удался: {e}")
+            await asyncio.sleep(5)
+            continue
+        for update in updates:
+            offset = update.update_id + 1
+            dispatch(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+
+
+def worker_main(index: int, workers: int, queue):
+    # Сигналы остановки обрабатывает принимающий процесс, воркер завершается по None в очереди
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ["WORKER_INDEX"] = str(index)
+    os.environ["UPDATE_WORKERS"] = str(workers)
+    import bot as app
+
+    asyncio.run(_worker_loop(app, queue))
+
+
+async def _worker_loop(app, queue):
+    from aiogram import types
+
+    await app.start_services()
+    serializer = KeyedSerializer()
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, queue.get)
+            if raw is None:
+                break
+            data = json.loads(raw)
+            update = types.Update.model_validate(data, context={"bot": app.bot})
+            serializer.submit(update_user_id(data), lambda u=update: app.dp.feed_update(app.bot, u))
+        await serializer.drain(STOP_TIMEOUT)
+    finally:
+        await app.stop_services()